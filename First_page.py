@@ -1,42 +1,248 @@
-from PyQt5.QtCore import QThread, Qt, pyqtSignal
-from PyQt5.QtGui import QCursor
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QWidget
+import os
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import QCursor, QImage, QPixmap
+from PyQt5.QtWidgets import (QAbstractItemView, QFileDialog, QHBoxLayout, QLabel, QMessageBox, QTableWidgetItem,
+                             QVBoxLayout, QWidget)
 
 from Ui_fst import Ui_FirstPage
-from qfluentwidgets import FluentIcon
+from qfluentwidgets import BodyLabel, CardWidget, CheckBox, ComboBox, FluentIcon, PushButton, SpinBox, TableWidget
 
-from services.pdf_service import compress_pdf
+from services.job_control import JobCancelled, JobControl
+from services.pdf_service import (MAX_RENDER_BYTES, compress_pdf, compress_pdf_to_size, estimate_compressed_size,
+                                  export_pdf_pages, extract_pdf_images, get_page_count, optimize_pdf, recompress_pdf_images,
+                                  render_preview)
+from services.render_cache import RenderCache
 from ver import VER
 
+# 共享调色板的抽样页数
+SHARED_PALETTE_PAGES = 8
+# 预览：停止拖动滑块多久后才开始渲染（毫秒），以及估算输出大小时抽样的页数
+PREVIEW_DEBOUNCE_MS = 300
+PREVIEW_SAMPLE_PAGES = 3
+# 预览缓存条目上限，避免来回拖动滑块时缓存无限增长
+PREVIEW_CACHE_SIZE = 32
+# 各次压缩共用的页面渲染缓存：换量化方法或编码方式重新压缩同一文件时不必重新渲染；
+# 缓存的是未压缩的采样数据，占用临时目录空间较多，由界面勾选后才启用
+RENDER_CACHE = RenderCache()
+
 
 class PdfCompressWorker(QThread):
     progress_changed = pyqtSignal(float)
     succeeded = pyqtSignal(str)
     failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
 
-    def __init__(self, pdf_path: str, out_dir: str, dpi: int, img_type: str = "png", method: int = 0):
+    def __init__(self, pdf_path: str, out_dir: str, dpi: int, img_type: str = "png", method: int = 0, workers: int = 1,
+                 mode: str = 'rasterize', palette_pages: int = 0, target_bytes: int = 0, encoder: str = 'rgb',
+                 control: JobControl | None = None, adaptive_dpi: bool = False, max_render_bytes: int = MAX_RENDER_BYTES,
+                 export_format: str = 'png', render_cache: RenderCache | None = None):
         super().__init__()
         self.pdf_path = pdf_path
         self.out_dir = out_dir
         self.dpi = dpi
         self.img_type = img_type
         self.method = method
+        self.workers = workers
+        self.mode = mode
+        self.palette_pages = palette_pages
+        self.target_bytes = target_bytes
+        self.encoder = encoder
+        self.adaptive_dpi = adaptive_dpi
+        self.max_render_bytes = max_render_bytes
+        self.export_format = export_format
+        self.render_cache = render_cache
+        # 批量任务中多个 worker 共用同一个 control，一次暂停/取消即作用于全部文件
+        self.control = control or JobControl()
+        self.stats: dict = {}
 
     def run(self):
         try:
-            out_path = compress_pdf(
-                pdf_path=self.pdf_path,
-                out_dir=self.out_dir,
-                dpi=self.dpi,
-                img_type=self.img_type,
-                method=self.method,
-                progress_cb=self.progress_changed.emit,
-            )
+            if self.mode == 'optimize':
+                result = optimize_pdf(
+                    pdf_path=self.pdf_path,
+                    out_dir=self.out_dir,
+                    progress_cb=self.progress_changed.emit,
+                )
+                self.stats.update(original_bytes=result.original_bytes, optimized_bytes=result.optimized_bytes)
+                out_path = result.out_path
+            elif self.mode == 'extract':
+                result = extract_pdf_images(
+                    pdf_path=self.pdf_path,
+                    out_dir=self.out_dir,
+                    progress_cb=self.progress_changed.emit,
+                    workers=self.workers,
+                    control=self.control,
+                )
+                self.stats.update(extracted_images=result.count, extracted_bytes=result.total_bytes,
+                                  images_per_sec=result.images_per_sec)
+                out_path = result.out_dir
+            elif self.mode == 'export':
+                out_path = export_pdf_pages(
+                    pdf_path=self.pdf_path,
+                    out_dir=self.out_dir,
+                    dpi=self.dpi,
+                    img_format=self.export_format,
+                    progress_cb=self.progress_changed.emit,
+                    workers=self.workers,
+                    control=self.control,
+                )
+                self.stats['exported'] = True
+            elif self.mode == 'images':
+                out_path = recompress_pdf_images(
+                    pdf_path=self.pdf_path,
+                    out_dir=self.out_dir,
+                    dpi=self.dpi,
+                    progress_cb=self.progress_changed.emit,
+                    control=self.control,
+                )
+            elif self.mode == 'size':
+                out_path = compress_pdf_to_size(
+                    pdf_path=self.pdf_path,
+                    out_dir=self.out_dir,
+                    target_bytes=self.target_bytes,
+                    method=self.method,
+                    max_dpi=self.dpi,
+                    progress_cb=self.progress_changed.emit,
+                    workers=self.workers,
+                    palette_pages=self.palette_pages,
+                    encoder=self.encoder,
+                    control=self.control,
+                    render_cache=self.render_cache,
+                    stats=self.stats,
+                    adaptive_dpi=self.adaptive_dpi,
+                    max_render_bytes=self.max_render_bytes,
+                )
+            else:
+                out_path = compress_pdf(
+                    pdf_path=self.pdf_path,
+                    out_dir=self.out_dir,
+                    dpi=self.dpi,
+                    img_type=self.img_type,
+                    method=self.method,
+                    progress_cb=self.progress_changed.emit,
+                    workers=self.workers,
+                    palette_pages=self.palette_pages,
+                    encoder=self.encoder,
+                    control=self.control,
+                    render_cache=self.render_cache,
+                    stats=self.stats,
+                    adaptive_dpi=self.adaptive_dpi,
+                    max_render_bytes=self.max_render_bytes,
+                )
             self.succeeded.emit(out_path)
+        except JobCancelled:
+            self.cancelled.emit()
         except Exception as exc:
             self.failed.emit(str(exc))
 
 
+class PdfPreviewWorker(QThread):
+    """后台渲染单页预览并估算输出大小，两者分别通过信号返回，预览图先行显示。"""
+
+    preview_ready = pyqtSignal(object, QImage, int)
+    size_ready = pyqtSignal(object, int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, key: tuple, size_key: tuple | None):
+        """key 为 (PDF 路径, 页码, DPI, 量化方法, 编码方式, 共享调色板抽样页数, 自适应 DPI, 单页渲染内存上限)；
+        size_key 为 None 时不再估算输出大小。"""
+        super().__init__()
+        self.key = key
+        self.size_key = size_key
+
+    def run(self):
+        pdf_path, page_index, dpi, method, encoder, palette_pages, adaptive_dpi, max_render_bytes = self.key
+        try:
+            image, page_bytes = render_preview(pdf_path, page_index, dpi, method=method, encoder=encoder,
+                                               palette_pages=palette_pages, adaptive_dpi=adaptive_dpi)
+            # QImage 可以在子线程中构造（QPixmap 不行）；copy 使其不再引用 image 的缓冲区
+            data = image.tobytes()
+            qimage = QImage(data, image.width, image.height, image.width * 3, QImage.Format_RGB888).copy()
+            self.preview_ready.emit(self.key, qimage, page_bytes)
+            if self.size_key is not None:
+                size = estimate_compressed_size(pdf_path, dpi, method=method, sample_pages=PREVIEW_SAMPLE_PAGES,
+                                                palette_pages=palette_pages, encoder=encoder,
+                                                max_render_bytes=max_render_bytes, adaptive_dpi=adaptive_dpi)
+                self.size_ready.emit(self.size_key, size)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class PdfBatchQueue(QObject):
+    """批量压缩队列：按并发上限依次启动 PdfCompressWorker，汇总单个文件与整体进度。"""
+
+    file_progress = pyqtSignal(int, float)
+    file_finished = pyqtSignal(int, str, str)
+    overall_progress = pyqtSignal(float, float)
+    finished = pyqtSignal(int, int)
+
+    def __init__(self, jobs: list[tuple[str, str]], max_concurrent: int, worker_factory, control: JobControl, parent=None):
+        """jobs 为 (PDF 路径, 输出目录) 列表；worker_factory(pdf_path, out_dir, control) 负责创建 worker。"""
+        super().__init__(parent)
+        self.jobs = jobs
+        self.max_concurrent = max(1, max_concurrent)
+        self.worker_factory = worker_factory
+        self.control = control
+        self.pending = deque(range(len(jobs)))
+        self.running: dict[int, PdfCompressWorker] = {}
+        self.sizes = [os.path.getsize(pdf_path) for pdf_path, _ in jobs]
+        self.progress = [0.0] * len(jobs)
+        self.succeeded_count = 0
+        self.failed_count = 0
+        self.started_at = 0.0
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.launch()
+
+    def launch(self):
+        """补足并发名额；暂停或取消时不再启动新文件。"""
+        while self.pending and len(self.running) < self.max_concurrent:
+            if self.control.is_paused or self.control.is_cancelled:
+                break
+            index = self.pending.popleft()
+            pdf_path, out_dir = self.jobs[index]
+            worker = self.worker_factory(pdf_path, out_dir, self.control)
+            worker.progress_changed.connect(lambda value, i=index: self._onProgress(i, value))
+            worker.succeeded.connect(lambda out_path, i=index: self._onDone(i, out_path, ''))
+            worker.failed.connect(lambda err_msg, i=index: self._onDone(i, '', err_msg))
+            worker.cancelled.connect(lambda i=index: self._onDone(i, '', '已取消'))
+            self.running[index] = worker
+            worker.start()
+
+        if not self.running and (not self.pending or self.control.is_cancelled):
+            self.finished.emit(self.succeeded_count, self.failed_count)
+
+    def _onProgress(self, index: int, value: float):
+        self.progress[index] = value
+        self.file_progress.emit(index, value)
+        self._emitOverall()
+
+    def _onDone(self, index: int, out_path: str, err_msg: str):
+        worker = self.running.pop(index, None)
+        if worker is not None:
+            worker.wait()
+        if err_msg:
+            self.failed_count += 1
+        else:
+            self.succeeded_count += 1
+            self.progress[index] = 100.0
+        self.file_finished.emit(index, out_path, err_msg)
+        self._emitOverall()
+        self.launch()
+
+    def _emitOverall(self):
+        # 按文件大小加权：大文件的进度对整体进度与吞吐量影响更大
+        total = sum(self.sizes) or 1
+        done = sum(size * value / 100 for size, value in zip(self.sizes, self.progress))
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        self.overall_progress.emit(done / total * 100, done / elapsed / 1024 / 1024)
+
+
 class FirstPage(QWidget, Ui_FirstPage):
 
     def __init__(self, parent=None):
@@ -47,6 +253,15 @@ class FirstPage(QWidget, Ui_FirstPage):
         self.filePathOut = ''
         self._dpi = 150
         self.worker = None
+        # 批量模式：选中的全部 PDF，以及选择文件夹时的根目录（用于在输出目录下保留子目录结构）
+        self.batchFiles: list[str] = []
+        self.batchRoot = ''
+        self.batch: PdfBatchQueue | None = None
+        # 预览：同一时间只有一个后台渲染，期间的新请求只记一个标记，渲染结束后按最新参数补做
+        self.previewWorker: PdfPreviewWorker | None = None
+        self.previewPending = False
+        self.previewCache: OrderedDict[tuple, tuple[QImage, int]] = OrderedDict()
+        self.sizeCache: OrderedDict[tuple, int] = OrderedDict()
 
         self.in_path.setIcon(FluentIcon.FOLDER)
         self.out_path.setIcon(FluentIcon.SAVE_AS)
@@ -56,41 +271,395 @@ class FirstPage(QWidget, Ui_FirstPage):
         self.out_path.clicked.connect(self.onOutpath)
         self.start_button.clicked.connect(self.onStart)
         self.custom_dpi.sliderMoved.connect(self.onTextChange)
+        self._setupOptionsUi()
+        self._setupPreviewUi()
+
+    def _setupOptionsUi(self):
+        # Ui_fst.py 由 pyuic 生成，新增的选项控件在这里用代码追加到对应卡片中
+        self.in_dir = PushButton('选择\n文件夹', self.CardWidget_2)
+        self.in_dir.setIcon(FluentIcon.FOLDER_ADD)
+        self.in_dir.setFont(self.in_path.font())
+        self.in_dir.setSizePolicy(self.in_path.sizePolicy())
+        self.in_dir.clicked.connect(self.onIndir)
+        self.horizontalLayout_2.addWidget(self.in_dir)
+
+        self.batch_table = TableWidget(self.CardWidget_2)
+        self.batch_table.setColumnCount(2)
+        self.batch_table.setHorizontalHeaderLabels(['文件', '状态'])
+        self.batch_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.batch_table.horizontalHeader().setStretchLastSection(True)
+        self.batch_table.verticalHeader().hide()
+        self.batch_table.hide()
+        self.verticalLayout_2.addWidget(self.batch_table)
+
+        self.mode_text = BodyLabel('压缩方式', self.CardWidget_3)
+        self.mode_combo = ComboBox(self.CardWidget_3)
+        # 无损优化放在第一位：几秒即可完成，不满意再选择有损方式
+        self.mode_combo.addItem('无损优化（最快，不改变画质）', userData='optimize')
+        self.mode_combo.addItem('整页栅格化（适合扫描件）', userData='rasterize')
+        self.mode_combo.addItem('仅压缩内嵌图片（保留文字）', userData='images')
+        self.mode_combo.addItem('指定目标大小（DPI 作为上限）', userData='size')
+        self.mode_combo.addItem('提取内嵌图片（原样导出，不重新编码）', userData='extract')
+        self.mode_combo.addItem('导出页面为图片（按 DPI 渲染为 PNG/JPG）', userData='export')
+        self.mode_combo.currentIndexChanged.connect(self.onModeChange)
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(self.mode_text)
+        mode_layout.addWidget(self.mode_combo, 1)
+        self.verticalLayout_4.addLayout(mode_layout)
+
+        self.target_size_text = BodyLabel('目标大小（MB）', self.CardWidget_3)
+        self.target_size_spin = SpinBox(self.CardWidget_3)
+        self.target_size_spin.setRange(1, 10240)
+        self.target_size_spin.setValue(10)
+        target_size_layout = QHBoxLayout()
+        target_size_layout.addWidget(self.target_size_text)
+        target_size_layout.addWidget(self.target_size_spin)
+        self.verticalLayout_4.addLayout(target_size_layout)
+
+        self.export_format_text = BodyLabel('导出图片格式', self.CardWidget_3)
+        self.export_format_combo = ComboBox(self.CardWidget_3)
+        self.export_format_combo.addItem('PNG（无损）', userData='png')
+        self.export_format_combo.addItem('JPG（体积小）', userData='jpg')
+        export_format_layout = QHBoxLayout()
+        export_format_layout.addWidget(self.export_format_text)
+        export_format_layout.addWidget(self.export_format_combo, 1)
+        self.verticalLayout_4.addLayout(export_format_layout)
+
+        self.workers_text = BodyLabel('并行进程数', self.CardWidget_3)
+        self.workers_spin = SpinBox(self.CardWidget_3)
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(self.workers_text)
+        workers_layout.addWidget(self.workers_spin)
+        self.verticalLayout_4.addLayout(workers_layout)
+
+        self.concurrent_text = BodyLabel('批量同时处理文件数', self.CardWidget_3)
+        self.concurrent_spin = SpinBox(self.CardWidget_3)
+        self.concurrent_spin.setRange(1, 16)
+        self.concurrent_spin.setValue(2)
+        concurrent_layout = QHBoxLayout()
+        concurrent_layout.addWidget(self.concurrent_text)
+        concurrent_layout.addWidget(self.concurrent_spin)
+        self.verticalLayout_4.addLayout(concurrent_layout)
+
+        self.render_memory_text = BodyLabel('单页渲染内存上限（MB，超大页面分条渲染）', self.CardWidget_3)
+        self.render_memory_spin = SpinBox(self.CardWidget_3)
+        self.render_memory_spin.setRange(16, 4096)
+        self.render_memory_spin.setValue(MAX_RENDER_BYTES // 1024 // 1024)
+        render_memory_layout = QHBoxLayout()
+        render_memory_layout.addWidget(self.render_memory_text)
+        render_memory_layout.addWidget(self.render_memory_spin)
+        self.verticalLayout_4.addLayout(render_memory_layout)
+
+        self.shared_palette_check = CheckBox('全文共享调色板（扫描书籍更快）', self.CardWidget_3)
+        self.verticalLayout_4.addWidget(self.shared_palette_check)
+
+        self.auto_encoder_check = CheckBox('按页自动选择编码（黑白/灰度/调色板/JPEG）', self.CardWidget_3)
+        self.auto_encoder_check.setChecked(True)
+        self.verticalLayout_4.addWidget(self.auto_encoder_check)
+
+        self.adaptive_dpi_check = CheckBox('按页自适应 DPI（低分辨率扫描页按原始分辨率，空白页最低分辨率）', self.CardWidget_3)
+        self.adaptive_dpi_check.setChecked(True)
+        self.verticalLayout_4.addWidget(self.adaptive_dpi_check)
+
+        self.render_cache_check = CheckBox('缓存页面渲染结果（换参数重新压缩同一文件时更快，占用临时目录空间）',
+                                           self.CardWidget_3)
+        self.clear_cache_button = PushButton('清空缓存', self.CardWidget_3)
+        self.clear_cache_button.setIcon(FluentIcon.DELETE)
+        self.clear_cache_button.clicked.connect(self.onClearCache)
+        render_cache_layout = QHBoxLayout()
+        render_cache_layout.addWidget(self.render_cache_check, 1)
+        render_cache_layout.addWidget(self.clear_cache_button)
+        self.verticalLayout_4.addLayout(render_cache_layout)
+
+        # 暂停 / 取消按钮放在进度条与开始按钮之间，仅在任务运行时可用
+        self.pause_button = PushButton('暂停', self.CardWidget_5)
+        self.pause_button.setIcon(FluentIcon.PAUSE)
+        self.pause_button.clicked.connect(self.onPause)
+        self.cancel_button = PushButton('取消', self.CardWidget_5)
+        self.cancel_button.setIcon(FluentIcon.CLOSE)
+        self.cancel_button.clicked.connect(self.onCancel)
+        self.horizontalLayout.insertWidget(1, self.pause_button)
+        self.horizontalLayout.insertWidget(2, self.cancel_button)
+        self._setTaskButtons(running=False)
+
+        self.batch_status_text = BodyLabel('', self.CardWidget_5)
+        self.batch_status_text.hide()
+        self.verticalLayout_3.addWidget(self.batch_status_text)
+
+        self.onModeChange()
+
+    def _setupPreviewUi(self):
+        self.preview_card = CardWidget(self.CardWidget_5)
+        preview_layout = QVBoxLayout(self.preview_card)
+
+        self.preview_page_text = BodyLabel('预览页码', self.preview_card)
+        self.preview_page_spin = SpinBox(self.preview_card)
+        self.preview_page_spin.setRange(1, 1)
+        page_layout = QHBoxLayout()
+        page_layout.addWidget(self.preview_page_text)
+        page_layout.addWidget(self.preview_page_spin)
+        page_layout.addStretch(1)
+        preview_layout.addLayout(page_layout)
+
+        self.preview_image = QLabel(self.preview_card)
+        self.preview_image.setAlignment(Qt.AlignCenter)
+        self.preview_image.setMinimumHeight(320)
+        preview_layout.addWidget(self.preview_image)
+
+        self.preview_info = BodyLabel('选择文件后显示压缩效果预览与预计大小', self.preview_card)
+        self.preview_info.setWordWrap(True)
+        preview_layout.addWidget(self.preview_info)
+
+        self.verticalLayout_3.insertWidget(self.verticalLayout_3.indexOf(self.CardWidget_3) + 1, self.preview_card)
+
+        # 防抖：参数变化后等待一小段时间再渲染，拖动滑块的过程中不会反复触发
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.refreshPreview)
+
+        self.custom_dpi.valueChanged.connect(self.schedulePreview)
+        self.preview_page_spin.valueChanged.connect(self.schedulePreview)
+        self.auto_encoder_check.stateChanged.connect(self.schedulePreview)
+        self.shared_palette_check.stateChanged.connect(self.schedulePreview)
+        self.adaptive_dpi_check.stateChanged.connect(self.schedulePreview)
+        self.render_memory_spin.valueChanged.connect(self.schedulePreview)
+        self.mode_combo.currentIndexChanged.connect(self.schedulePreview)
+
+    def onModeChange(self):
+        is_size_mode = self.mode_combo.currentData() == 'size'
+        self.target_size_text.setVisible(is_size_mode)
+        self.target_size_spin.setVisible(is_size_mode)
+        is_export_mode = self.mode_combo.currentData() == 'export'
+        self.export_format_text.setVisible(is_export_mode)
+        self.export_format_combo.setVisible(is_export_mode)
+
+    def schedulePreview(self):
+        self.preview_timer.start()
+
+    def _previewKeys(self) -> tuple[tuple, tuple]:
+        encoder = 'auto' if self.auto_encoder_check.isChecked() else 'rgb'
+        palette_pages = SHARED_PALETTE_PAGES if self.shared_palette_check.isChecked() else 0
+        adaptive_dpi = self.adaptive_dpi_check.isChecked()
+        max_render_bytes = self.render_memory_spin.value() * 1024 * 1024
+        # 影响输出的设置都要计入缓存键，切换后不会显示按旧设置生成的预览与预计大小
+        key = (self.filePathIn, self.preview_page_spin.value() - 1, self.custom_dpi.value(), 0, encoder, palette_pages,
+               adaptive_dpi, max_render_bytes)
+        return key, (self.filePathIn, key[2], key[3], encoder, palette_pages, adaptive_dpi, max_render_bytes)
+
+    def refreshPreview(self):
+        if not self.filePathIn:
+            return
+        if self.mode_combo.currentData() in ('optimize', 'images', 'extract', 'export'):
+            self.preview_image.clear()
+            self.preview_info.setText(f'“{self.mode_combo.currentText()}”模式保留原有页面内容，不提供栅格化预览')
+            return
+
+        key, size_key = self._previewKeys()
+        self._showPreview()
+        if key in self.previewCache and size_key in self.sizeCache:
+            return
+        if self.previewWorker is not None:
+            self.previewPending = True
+            return
+
+        self.previewWorker = PdfPreviewWorker(key, None if size_key in self.sizeCache else size_key)
+        self.previewWorker.preview_ready.connect(self.onPreviewReady)
+        self.previewWorker.size_ready.connect(self.onPreviewSizeReady)
+        self.previewWorker.failed.connect(self.onPreviewError)
+        self.previewWorker.finished.connect(self.onPreviewFinished)
+        self.previewWorker.start()
+
+    def _showPreview(self):
+        key, size_key = self._previewKeys()
+        cached = self.previewCache.get(key)
+        if cached is None:
+            self.preview_info.setText('正在生成预览…')
+            return
+        self.previewCache.move_to_end(key)
+        qimage, page_bytes = cached
+        self.preview_image.setPixmap(QPixmap.fromImage(qimage).scaled(
+            self.preview_image.width(), self.preview_image.height(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+        size = self.sizeCache.get(size_key)
+        source_mb = os.path.getsize(self.filePathIn) / 1024 / 1024
+        projected = '正在估算…' if size is None else f'约 {size / 1024 / 1024:.2f} MB（原文件 {source_mb:.2f} MB）'
+        self.preview_info.setText(f'第 {key[1] + 1} 页，{key[2]} DPI，预览页编码后约 {page_bytes / 1024:.0f} KB · 预计输出：{projected}')
+
+    def onPreviewReady(self, key: tuple, qimage: QImage, page_bytes: int):
+        self.previewCache[key] = (qimage, page_bytes)
+        if len(self.previewCache) > PREVIEW_CACHE_SIZE:
+            self.previewCache.popitem(last=False)
+        self._showPreview()
+
+    def onPreviewSizeReady(self, size_key: tuple, size: int):
+        self.sizeCache[size_key] = size
+        if len(self.sizeCache) > PREVIEW_CACHE_SIZE:
+            self.sizeCache.popitem(last=False)
+        self._showPreview()
+
+    def onPreviewError(self, err_msg: str):
+        self.preview_info.setText(f'预览失败：{err_msg}')
+
+    def onPreviewFinished(self):
+        self.previewWorker = None
+        if self.previewPending:
+            self.previewPending = False
+            self.refreshPreview()
 
     def updateBar(self, step):
         self.progressBar.setVal(float(step))
 
-    def onCompressSuccess(self, out_path: str):
-        QMessageBox.information(self, 'PDF操作', f'压缩完成！\n输出文件：\n{out_path}')
+    def _setTaskButtons(self, running: bool):
+        self.start_button.setEnabled(not running)
+        self.pause_button.setEnabled(running)
+        self.cancel_button.setEnabled(running)
+        self.pause_button.setText('暂停')
+        self.pause_button.setIcon(FluentIcon.PAUSE)
+
+    def _finishTask(self):
         self.progressBar.setVal(0)
         self.setCursor(QCursor(Qt.ArrowCursor))
-        self.start_button.setEnabled(True)
+        self._setTaskButtons(running=False)
         self.worker = None
+        self.batch = None
+
+    def _isBusy(self) -> bool:
+        return self.batch is not None or (self.worker is not None and self.worker.isRunning())
+
+    def _activeControl(self) -> JobControl | None:
+        if self.batch is not None:
+            return self.batch.control
+        if self.worker is not None:
+            return self.worker.control
+        return None
+
+    def onCompressSuccess(self, out_path: str):
+        stats = self.worker.stats if self.worker is not None else {}
+        if 'extracted_images' in stats:
+            QMessageBox.information(self, 'PDF操作', (
+                f"提取完成！共 {stats['extracted_images']} 张图片，{stats['extracted_bytes'] / 1024 / 1024:.2f} MB，"
+                f"{stats['images_per_sec']:.1f} 张/秒\n输出目录：\n{out_path}"))
+            self._finishTask()
+            return
+        if stats.get('exported'):
+            QMessageBox.information(self, 'PDF操作', f'导出完成！\n输出目录：\n{out_path}')
+            self._finishTask()
+            return
+        message = f'压缩完成！\n输出文件：\n{out_path}'
+        if 'optimized_bytes' in stats:
+            message += (f"\n{stats['original_bytes'] / 1024 / 1024:.2f} MB → {stats['optimized_bytes'] / 1024 / 1024:.2f} MB"
+                        f"（减少 {1 - stats['optimized_bytes'] / max(stats['original_bytes'], 1):.1%}）")
+        if stats.get('duplicate_pages'):
+            message += f"\n{stats['duplicate_pages']} 页与前面的页面相同，只保存了一份"
+        if stats.get('adaptive_pages'):
+            message += f"\n{stats['adaptive_pages']} 页按内容使用了低于设定值的 DPI"
+        if stats.get('cache_hits'):
+            message += (f"\n渲染缓存命中 {stats['cache_hit_rate']:.0%}，"
+                        f"省去 {stats['cache_bytes_saved'] / 1024 / 1024:.0f} MB 页面渲染")
+        QMessageBox.information(self, 'PDF操作', message)
+        self._finishTask()
 
     def onCompressError(self, err_msg: str):
         QMessageBox.critical(self, 'PDF操作失败', f'压缩失败：{err_msg}')
-        self.progressBar.setVal(0)
-        self.setCursor(QCursor(Qt.ArrowCursor))
-        self.start_button.setEnabled(True)
-        self.worker = None
+        self._finishTask()
+
+    def onCompressCancelled(self):
+        message = '已取消压缩。'
+        # 只有整页栅格化（含指定目标大小）会记录断点，其他模式取消后需重新开始
+        if self.worker.mode in ('rasterize', 'size'):
+            message += '\n已完成的页面已保存，以相同设置再次压缩该文件时将从中断处继续。'
+        QMessageBox.information(self, 'PDF操作', message)
+        self._finishTask()
+
+    def onPause(self):
+        control = self._activeControl()
+        if control is None:
+            return
+        if control.is_paused:
+            control.resume()
+            if self.batch is not None:
+                self.batch.launch()
+            self.pause_button.setText('暂停')
+            self.pause_button.setIcon(FluentIcon.PAUSE)
+            self.setCursor(QCursor(Qt.WaitCursor))
+        else:
+            control.pause()
+            self.pause_button.setText('继续')
+            self.pause_button.setIcon(FluentIcon.PLAY)
+            self.setCursor(QCursor(Qt.ArrowCursor))
+
+    def onCancel(self):
+        control = self._activeControl()
+        if control is None:
+            return
+        control.cancel()
+        if self.batch is not None:
+            # 暂停期间可能没有正在运行的文件，需要由队列自行结束
+            self.batch.launch()
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
 
     def onInpath(self):
-        self.filePathIn, _ = QFileDialog.getOpenFileName(
+        files, _ = QFileDialog.getOpenFileNames(
             self,
-            "选择要压缩的PDF",
+            "选择要压缩的PDF（可多选）",
             r"c:\\",
             "PDF文件 (*.pdf)",
         )
-        if not self.filePathIn:
+        if not files:
+            return
+        self._setInputFiles(files, '')
+
+    def onIndir(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择包含PDF的文件夹")
+        if not folder:
+            return
+        files = sorted(str(path) for path in Path(folder).rglob('*') if path.suffix.lower() == '.pdf' and path.is_file())
+        if not files:
+            QMessageBox.warning(self, '警告', '该文件夹（含子文件夹）中没有PDF文件')
             return
-        self.in_path_text.setText('已选择文件:\n' + self.filePathIn)
+        self._setInputFiles(files, folder)
+
+    def _setInputFiles(self, files: list[str], root: str):
+        self.filePathIn = files[0]
+        try:
+            self.preview_page_spin.setRange(1, max(1, get_page_count(self.filePathIn)))
+        except Exception as e:
+            QMessageBox.warning(self, '警告', f'无法打开PDF：{e}')
+        self.preview_page_spin.setValue(1)
+        self.schedulePreview()
+        self.batchFiles = files if len(files) > 1 else []
+        self.batchRoot = root
+        if not self.batchFiles:
+            self.in_path_text.setText('已选择文件:\n' + self.filePathIn)
+            self.batch_table.hide()
+            return
+
+        self.in_path_text.setText(f'已选择 {len(files)} 个文件' + (f'，来自：\n{root}' if root else ''))
+        self.batch_table.setRowCount(len(files))
+        for row, pdf_path in enumerate(files):
+            name = os.path.relpath(pdf_path, root) if root else os.path.basename(pdf_path)
+            self.batch_table.setItem(row, 0, QTableWidgetItem(name))
+            self.batch_table.setItem(row, 1, QTableWidgetItem('等待中'))
+        self.batch_table.resizeColumnsToContents()
+        self.batch_table.show()
 
     def onOutpath(self):
         self.filePathOut = QFileDialog.getExistingDirectory(self, "选择存储路径")
         self.out_path_text.setText('已选择目录:\n' + self.filePathOut)
 
+    def onClearCache(self):
+        if self._isBusy():
+            QMessageBox.warning(self, '警告', '压缩任务正在进行中，请稍后')
+            return
+        RENDER_CACHE.clear()
+        QMessageBox.information(self, 'PDF操作', '已清空页面渲染缓存')
+
     def onStart(self):
-        if self.worker is not None and self.worker.isRunning():
+        if self._isBusy():
             QMessageBox.warning(self, '警告', '压缩任务正在进行中，请稍后')
             return
 
@@ -103,14 +672,80 @@ class FirstPage(QWidget, Ui_FirstPage):
             return
 
         self.setCursor(QCursor(Qt.WaitCursor))
-        self.start_button.setEnabled(False)
+        self._setTaskButtons(running=True)
+
+        if self.batchFiles:
+            self._startBatch()
+            return
 
-        self.worker = PdfCompressWorker(self.filePathIn, self.filePathOut, self._dpi)
+        self.worker = self._createWorker(self.filePathIn, self.filePathOut)
         self.worker.progress_changed.connect(self.updateBar)
         self.worker.succeeded.connect(self.onCompressSuccess)
         self.worker.failed.connect(self.onCompressError)
+        self.worker.cancelled.connect(self.onCompressCancelled)
         self.worker.start()
 
+    def _createWorker(self, pdf_path: str, out_dir: str, control: JobControl | None = None,
+                      workers: int | None = None) -> PdfCompressWorker:
+        return PdfCompressWorker(
+            pdf_path,
+            out_dir,
+            self._dpi,
+            workers=workers or self.workers_spin.value(),
+            mode=self.mode_combo.currentData(),
+            palette_pages=SHARED_PALETTE_PAGES if self.shared_palette_check.isChecked() else 0,
+            target_bytes=self.target_size_spin.value() * 1024 * 1024,
+            encoder='auto' if self.auto_encoder_check.isChecked() else 'rgb',
+            control=control,
+            adaptive_dpi=self.adaptive_dpi_check.isChecked(),
+            max_render_bytes=self.render_memory_spin.value() * 1024 * 1024,
+            export_format=self.export_format_combo.currentData(),
+            render_cache=RENDER_CACHE if self.render_cache_check.isChecked() else None,
+        )
+
+    def _startBatch(self):
+        jobs = []
+        for pdf_path in self.batchFiles:
+            out_dir = self.filePathOut
+            # 选择文件夹时，在输出目录下保留原有的子目录结构，避免不同子目录中的同名文件互相覆盖
+            if out_dir and self.batchRoot:
+                out_dir = os.path.join(out_dir, os.path.relpath(os.path.dirname(pdf_path), self.batchRoot))
+                os.makedirs(out_dir, exist_ok=True)
+            jobs.append((pdf_path, out_dir))
+
+        for row in range(self.batch_table.rowCount()):
+            self.batch_table.setItem(row, 1, QTableWidgetItem('等待中'))
+        self.batch_status_text.setText(f'0/{len(jobs)} 个文件')
+        self.batch_status_text.show()
+
+        # 每个文件各自建立进程池：同时处理的文件平分设定的进程数，避免总进程数成倍超出 CPU 核数
+        concurrency = min(self.concurrent_spin.value(), len(jobs))
+        workers = max(1, self.workers_spin.value() // concurrency)
+        self.batch = PdfBatchQueue(jobs, concurrency,
+                                   lambda pdf_path, out_dir, control: self._createWorker(pdf_path, out_dir, control, workers),
+                                   JobControl(), self)
+        self.batch.file_progress.connect(self.onBatchFileProgress)
+        self.batch.file_finished.connect(self.onBatchFileFinished)
+        self.batch.overall_progress.connect(self.onBatchOverallProgress)
+        self.batch.finished.connect(self.onBatchFinished)
+        self.batch.start()
+
+    def onBatchFileProgress(self, index: int, value: float):
+        self.batch_table.setItem(index, 1, QTableWidgetItem(f'{value:.0f}%'))
+
+    def onBatchFileFinished(self, index: int, out_path: str, err_msg: str):
+        status = f'失败：{err_msg}' if err_msg else '完成'
+        self.batch_table.setItem(index, 1, QTableWidgetItem(status))
+
+    def onBatchOverallProgress(self, value: float, throughput: float):
+        self.updateBar(value)
+        done = self.batch.succeeded_count + self.batch.failed_count if self.batch else 0
+        self.batch_status_text.setText(f'{done}/{len(self.batchFiles)} 个文件 · {throughput:.2f} MB/s')
+
+    def onBatchFinished(self, succeeded: int, failed: int):
+        QMessageBox.information(self, 'PDF操作', f'批量压缩结束：成功 {succeeded} 个，失败或取消 {failed} 个')
+        self._finishTask()
+
     def onChoice(self):
         choiceId = self.choice_buttonGroup.checkedId()
         if choiceId == -2:
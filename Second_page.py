@@ -1,14 +1,101 @@
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QWidget
+import os
 
-from Ui_sec import Ui_SecondPage
-from qfluentwidgets import FluentIcon
+from PyQt5.QtCore import QThread, Qt, pyqtSignal
+from PyQt5.QtGui import QCursor
+from PyQt5.QtWidgets import QFileDialog, QHBoxLayout, QMessageBox, QWidget
 
-from PIL import Image
+from Ui_sec import Ui_SecondPage
+from qfluentwidgets import BodyLabel, CheckBox, ComboBox, DoubleSpinBox, FluentIcon, ProgressBar, PushButton, SpinBox
 
-from services.image_service import convert_image
+from services.image_service import (ICO_SIZES, JPEG_444_QUALITY, BatchConvertResult, JpegEncodeResult, JpegOptions,
+                                    collect_image_files, convert_image_file, convert_images, probe_image)
+from services.job_control import JobCancelled, JobControl
 from ver import VER
 
 
+class ImageConvertWorker(QThread):
+    """后台转换图片：打开、解码与保存都在子线程中进行，界面线程不做任何解码。"""
+
+    progress_changed = pyqtSignal(float)
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, input_path: str, out_dir: str, out_format: str, ico_sizes=None, sharpen: bool = False,
+                 jpeg: JpegOptions | None = None):
+        super().__init__()
+        self.input_path = input_path
+        self.out_dir = out_dir
+        self.out_format = out_format
+        self.ico_sizes = ico_sizes
+        self.sharpen = sharpen
+        self.jpeg = jpeg
+        self.stats = {}
+        self.control = JobControl()
+
+    def run(self):
+        try:
+            out_path = convert_image_file(
+                self.input_path,
+                self.out_dir,
+                self.out_format,
+                progress_cb=self.progress_changed.emit,
+                control=self.control,
+                ico_sizes=self.ico_sizes,
+                sharpen=self.sharpen,
+                jpeg=self.jpeg,
+                stats=self.stats,
+            )
+            self.succeeded.emit(out_path)
+        except JobCancelled:
+            self.cancelled.emit()
+        except Exception as exc:
+            self.failed.emit(str(exc))
+
+
+class ImageBatchWorker(QThread):
+    """后台批量转换：由进程池并行处理多个文件，逐个文件回报结果。"""
+
+    progress_changed = pyqtSignal(float)
+    file_finished = pyqtSignal(int, str, str)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, inputs: list[str] | str, out_dir: str, out_format: str, workers: int | None = None,
+                 ico_sizes=None, sharpen: bool = False, jpeg: JpegOptions | None = None):
+        """inputs 为文件列表或目录。"""
+        super().__init__()
+        self.inputs = inputs
+        self.out_dir = out_dir
+        self.out_format = out_format
+        self.workers = workers
+        self.ico_sizes = ico_sizes
+        self.sharpen = sharpen
+        self.jpeg = jpeg
+        self.control = JobControl()
+
+    def run(self):
+        try:
+            result = convert_images(
+                self.inputs,
+                self.out_dir,
+                self.out_format,
+                workers=self.workers,
+                progress_cb=self.progress_changed.emit,
+                result_cb=lambda index, r: self.file_finished.emit(index, r.output_path, r.error),
+                control=self.control,
+                ico_sizes=self.ico_sizes,
+                sharpen=self.sharpen,
+                jpeg=self.jpeg,
+            )
+            self.succeeded.emit(result)
+        except JobCancelled:
+            self.cancelled.emit()
+        except Exception as exc:
+            self.failed.emit(str(exc))
+
+
 class SecondPage(QWidget, Ui_SecondPage):
 
     def __init__(self, parent=None):
@@ -18,7 +105,12 @@ class SecondPage(QWidget, Ui_SecondPage):
         self.filePathIn = ''
         self.filePathOut = ''
         self.outType = ''
-        self.image: Image.Image | None = None
+        self.worker: ImageConvertWorker | ImageBatchWorker | None = None
+        # 批量模式：多选的文件列表，或选择的文件夹（转换时在输出目录下保留子目录结构）
+        self.batchFiles: list[str] = []
+        self.batchDir = ''
+        self.batchDone = 0
+        self.batchErrors: list[str] = []
 
         self.in_path_ico.setIcon(FluentIcon.FOLDER)
         self.out_path_ico.setIcon(FluentIcon.SAVE_AS)
@@ -28,18 +120,126 @@ class SecondPage(QWidget, Ui_SecondPage):
         self.out_path_ico.clicked.connect(self.onOutpath)
         self.start_button_ico.clicked.connect(self.onStart)
         self.type_buttonGroup.buttonClicked.connect(self.onChooseType)
+        self._setupTaskUi()
+
+    def _setupTaskUi(self):
+        # Ui_sec.py 由 pyuic 生成，新增控件在这里用代码插入
+        self.in_dir_ico = PushButton('选择\n文件夹', self.CardWidget_2)
+        self.in_dir_ico.setIcon(FluentIcon.FOLDER_ADD)
+        self.in_dir_ico.setFont(self.in_path_ico.font())
+        self.in_dir_ico.setSizePolicy(self.in_path_ico.sizePolicy())
+        self.in_dir_ico.clicked.connect(self.onIndir)
+        self.horizontalLayout_5.addWidget(self.in_dir_ico)
+
+        self.batch_status_text = BodyLabel('', self.CardWidget)
+        self.batch_status_text.hide()
+        self.verticalLayout_9.insertWidget(self.verticalLayout_9.indexOf(self.start_button_ico), self.batch_status_text)
+
+        self.progressBar = ProgressBar(self.CardWidget)
+        self.cancel_button = PushButton('取消', self.CardWidget)
+        self.cancel_button.setIcon(FluentIcon.CLOSE)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.onCancel)
+        task_layout = QHBoxLayout()
+        task_layout.addWidget(self.progressBar, 1)
+        task_layout.addWidget(self.cancel_button)
+        self.verticalLayout_9.insertLayout(self.verticalLayout_9.indexOf(self.start_button_ico), task_layout)
+
+        # ICO 选项：仅在选择 ico 格式时显示
+        self.ico_options = QWidget(self.CardWidget_3)
+        ico_layout = QHBoxLayout(self.ico_options)
+        ico_layout.setContentsMargins(0, 0, 0, 0)
+        ico_layout.addWidget(BodyLabel('图标尺寸：', self.ico_options))
+        self.ico_size_checks: dict[int, CheckBox] = {}
+        for size in ICO_SIZES:
+            check = CheckBox(str(size), self.ico_options)
+            check.setChecked(True)
+            ico_layout.addWidget(check)
+            self.ico_size_checks[size] = check
+        self.ico_sharpen_check = CheckBox('缩小后锐化', self.ico_options)
+        ico_layout.addWidget(self.ico_sharpen_check)
+        ico_layout.addStretch(1)
+        self.ico_options.hide()
+        self.verticalLayout_5.addWidget(self.ico_options)
+
+        # JPG/JPEG 选项：仅在选择 jpg 或 jpeg 格式时显示
+        self.jpeg_options = QWidget(self.CardWidget_3)
+        jpeg_layout = QHBoxLayout(self.jpeg_options)
+        jpeg_layout.setContentsMargins(0, 0, 0, 0)
+        self.jpeg_mode_combo = ComboBox(self.jpeg_options)
+        # 默认项不传编码参数：JPEG 转 JPEG 直接复制，其余按 Pillow 默认质量编码
+        self.jpeg_mode_combo.addItem('默认（相同格式直接复制）', userData='default')
+        self.jpeg_mode_combo.addItem('固定质量', userData='quality')
+        self.jpeg_mode_combo.addItem('目标大小（KB）', userData='size')
+        self.jpeg_mode_combo.addItem('SSIM 下限', userData='ssim')
+        self.jpeg_mode_combo.currentIndexChanged.connect(self.onJpegModeChange)
+        self.jpeg_quality_spin = SpinBox(self.jpeg_options)
+        self.jpeg_quality_spin.setRange(1, 95)
+        self.jpeg_quality_spin.setValue(85)
+        self.jpeg_size_spin = SpinBox(self.jpeg_options)
+        self.jpeg_size_spin.setRange(1, 102400)
+        self.jpeg_size_spin.setValue(500)
+        self.jpeg_ssim_spin = DoubleSpinBox(self.jpeg_options)
+        self.jpeg_ssim_spin.setRange(0.5, 0.999)
+        self.jpeg_ssim_spin.setDecimals(3)
+        self.jpeg_ssim_spin.setSingleStep(0.005)
+        self.jpeg_ssim_spin.setValue(0.95)
+        self.jpeg_optimize_check = CheckBox('优化哈夫曼表', self.jpeg_options)
+        self.jpeg_optimize_check.setChecked(True)
+        self.jpeg_progressive_check = CheckBox('渐进式', self.jpeg_options)
+        self.jpeg_subsampling_combo = ComboBox(self.jpeg_options)
+        self.jpeg_subsampling_combo.addItem(f'色度采样：自动（质量 ≥ {JPEG_444_QUALITY} 时 4:4:4，否则 4:2:0）', userData=None)
+        for subsampling in ('4:4:4', '4:2:2', '4:2:0'):
+            self.jpeg_subsampling_combo.addItem(f'色度采样：{subsampling}', userData=subsampling)
+        for widget in (self.jpeg_mode_combo, self.jpeg_quality_spin, self.jpeg_size_spin, self.jpeg_ssim_spin,
+                       self.jpeg_optimize_check, self.jpeg_progressive_check, self.jpeg_subsampling_combo):
+            jpeg_layout.addWidget(widget)
+        jpeg_layout.addStretch(1)
+        self.jpeg_options.hide()
+        self.verticalLayout_5.addWidget(self.jpeg_options)
+        self.onJpegModeChange()
 
     def onInpath(self):
-        self.filePathIn, _ = QFileDialog.getOpenFileName(
+        files, _ = QFileDialog.getOpenFileNames(
             self,
-            "选择要转换的图片",
+            "选择要转换的图片（可多选）",
             r"c:\\",
             "Images (*.png *.jpg *.jpeg *.bmp *.gif)",
         )
-        if self.filePathIn == '':
+        if not files:
+            return
+        # 只记录路径，图片的解码放到后台 worker 中进行；多选时连文件头也不读，选择再多文件也不会卡顿
+        self.filePathIn = files[0]
+        self.batchFiles = files if len(files) > 1 else []
+        self.batchDir = ''
+        if self.batchFiles:
+            self.in_path_text_ico.setText(f'已选择 {len(files)} 个文件')
+            return
+
+        try:
+            info = probe_image(self.filePathIn)
+        except Exception as exc:
+            self.filePathIn = ''
+            QMessageBox.warning(self, '警告', f'无法识别该图片：{exc}')
             return
-        self.image = Image.open(self.filePathIn)
-        self.in_path_text_ico.setText('已选择文件:\n' + self.filePathIn)
+        frames = f' · {info.frames} 帧' if info.frames > 1 else ''
+        self.in_path_text_ico.setText(
+            f'已选择文件:\n{self.filePathIn}\n'
+            f'{info.format} · {info.width}×{info.height} · {info.mode}{frames} · {info.file_size / 1024 / 1024:.2f} MB'
+        )
+
+    def onIndir(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择包含图片的文件夹")
+        if not folder:
+            return
+        files, _ = collect_image_files(folder)
+        if not files:
+            QMessageBox.warning(self, '警告', '该文件夹（含子文件夹）中没有支持的图片')
+            return
+        self.filePathIn = files[0]
+        self.batchFiles = files
+        self.batchDir = folder
+        self.in_path_text_ico.setText(f'已选择 {len(files)} 个文件，来自：\n{folder}')
 
     def onOutpath(self):
         self.filePathOut = QFileDialog.getExistingDirectory(self, "选择存储路径")
@@ -59,8 +259,116 @@ class SecondPage(QWidget, Ui_SecondPage):
             self.outType = 'png'
         elif choiceId == -7:
             self.outType = 'ico'
+        self.ico_options.setVisible(self.outType == 'ico')
+        self.jpeg_options.setVisible(self.outType in ('jpg', 'jpeg'))
+
+    def onJpegModeChange(self):
+        mode = self.jpeg_mode_combo.currentData()
+        self.jpeg_quality_spin.setVisible(mode == 'quality')
+        self.jpeg_size_spin.setVisible(mode == 'size')
+        self.jpeg_ssim_spin.setVisible(mode == 'ssim')
+        for widget in (self.jpeg_optimize_check, self.jpeg_progressive_check, self.jpeg_subsampling_combo):
+            widget.setVisible(mode != 'default')
+
+    def _jpegOptions(self) -> JpegOptions | None:
+        mode = self.jpeg_mode_combo.currentData()
+        if self.outType not in ('jpg', 'jpeg') or mode == 'default':
+            return None
+        options = JpegOptions(
+            quality=self.jpeg_quality_spin.value(),
+            optimize=self.jpeg_optimize_check.isChecked(),
+            progressive=self.jpeg_progressive_check.isChecked(),
+            subsampling=self.jpeg_subsampling_combo.currentData(),
+        )
+        if mode == 'size':
+            options.target_bytes = self.jpeg_size_spin.value() * 1024
+        elif mode == 'ssim':
+            options.min_ssim = self.jpeg_ssim_spin.value()
+        return options
+
+    @staticmethod
+    def _jpegSummary(result: JpegEncodeResult) -> str:
+        summary = f'质量 {result.quality}，{result.size / 1024:.0f} KB'
+        if result.ssim is not None:
+            summary += f'，SSIM {result.ssim:.3f}'
+        if not result.met:
+            summary += '（未达到目标）'
+        return summary
+
+    def _icoOptions(self) -> tuple[tuple[int, ...] | None, bool]:
+        if self.outType != 'ico':
+            return None, False
+        sizes = tuple(size for size, check in self.ico_size_checks.items() if check.isChecked())
+        return sizes, self.ico_sharpen_check.isChecked()
+
+    def updateBar(self, step):
+        self.progressBar.setVal(float(step))
+
+    def _setRunning(self, running: bool):
+        self.start_button_ico.setEnabled(not running)
+        self.cancel_button.setEnabled(running)
+        self.setCursor(QCursor(Qt.WaitCursor if running else Qt.ArrowCursor))
+
+    def _finishTask(self):
+        self.progressBar.setVal(0)
+        self._setRunning(False)
+        self.batch_status_text.hide()
+        self.worker = None
+
+    def onConvertSuccess(self, out_file: str):
+        message = f'转换完成！\n输出文件：\n{out_file}'
+        jpeg = self.worker.stats.get('jpeg')
+        if jpeg is not None:
+            message += (f'\n\n{self._jpegSummary(jpeg)}，尝试 {jpeg.tries} 次'
+                        f'\n优化哈夫曼表：{"是" if jpeg.optimize else "否"}，渐进式：{"是" if jpeg.progressive else "否"}，'
+                        f'色度采样：{jpeg.subsampling}')
+        QMessageBox.information(self, '图片转换', message)
+        self._finishTask()
+
+    def onConvertError(self, err_msg: str):
+        QMessageBox.critical(self, '图片转换失败', f'转换失败：{err_msg}')
+        self._finishTask()
+
+    def onBatchFileFinished(self, index: int, out_file: str, err_msg: str):
+        self.batchDone += 1
+        if err_msg:
+            self.batchErrors.append(f'{os.path.basename(self.batchFiles[index])}：{err_msg}')
+        self.batch_status_text.setText(f'{self.batchDone}/{len(self.batchFiles)} 个文件，失败 {len(self.batchErrors)} 个')
+
+    def onBatchSuccess(self, result: BatchConvertResult):
+        message = (f'批量转换完成：成功 {result.succeeded} 个，失败 {result.failed} 个\n'
+                   f'耗时 {result.seconds:.1f} 秒，{result.files_per_sec:.1f} 个/秒，{result.mb_per_sec:.1f} MB/秒')
+        if result.fast_path:
+            message += f'\n其中 {result.fast_path} 个文件格式相同或只需更换容器，未重新编码'
+        encoded = [r for r in result.results if r.jpeg is not None]
+        if encoded:
+            lines = [f'{os.path.basename(r.input_path)}：{self._jpegSummary(r.jpeg)}' for r in encoded[:10]]
+            more = f'\n……另有 {len(encoded) - 10} 个' if len(encoded) > 10 else ''
+            missed = sum(1 for r in encoded if not r.jpeg.met)
+            message += (f'\n\nJPEG 平均质量 {sum(r.jpeg.quality for r in encoded) / len(encoded):.0f}，'
+                        f'{missed} 个未达到目标\n' + '\n'.join(lines) + more)
+        if self.batchErrors:
+            shown = '\n'.join(self.batchErrors[:10])
+            more = f'\n……另有 {len(self.batchErrors) - 10} 个' if len(self.batchErrors) > 10 else ''
+            message += f'\n\n失败的文件：\n{shown}{more}'
+        QMessageBox.information(self, '图片转换', message)
+        self._finishTask()
+
+    def onConvertCancelled(self):
+        QMessageBox.information(self, '图片转换', '已取消转换')
+        self._finishTask()
+
+    def onCancel(self):
+        if self.worker is None:
+            return
+        self.worker.control.cancel()
+        self.cancel_button.setEnabled(False)
 
     def onStart(self):
+        if self.worker is not None and self.worker.isRunning():
+            QMessageBox.warning(self, '警告', '转换任务正在进行中，请稍后')
+            return
+
         if self.filePathIn == '':
             QMessageBox.warning(self, '警告', '文件未选择')
             return
@@ -69,12 +377,32 @@ class SecondPage(QWidget, Ui_SecondPage):
             QMessageBox.warning(self, '警告', '请选择输出格式')
             return
 
-        if self.image is None:
-            QMessageBox.warning(self, '警告', '图片尚未加载')
+        ico_sizes, sharpen = self._icoOptions()
+        jpeg = self._jpegOptions()
+        if ico_sizes == ():
+            QMessageBox.warning(self, '警告', '请至少选择一个图标尺寸')
             return
 
-        try:
-            out_file = convert_image(self.image, self.filePathIn, self.filePathOut, self.outType)
-            QMessageBox.information(self, '图片转换', f'转换完成！\n输出文件：\n{out_file}')
-        except Exception as exc:
-            QMessageBox.critical(self, '图片转换失败', f'转换失败：{exc}')
+        self._setRunning(True)
+        if self.batchFiles:
+            self.batchDone = 0
+            self.batchErrors = []
+            self.batch_status_text.setText(f'0/{len(self.batchFiles)} 个文件')
+            self.batch_status_text.show()
+            # 选择文件夹时传目录，由服务层在输出目录下保留子目录结构
+            self.worker = ImageBatchWorker(self.batchDir or self.batchFiles, self.filePathOut, self.outType,
+                                           ico_sizes=ico_sizes, sharpen=sharpen, jpeg=jpeg)
+            self.worker.progress_changed.connect(self.updateBar)
+            self.worker.file_finished.connect(self.onBatchFileFinished)
+            self.worker.succeeded.connect(self.onBatchSuccess)
+            self.worker.failed.connect(self.onConvertError)
+            self.worker.cancelled.connect(self.onConvertCancelled)
+            self.worker.start()
+            return
+
+        self.worker = ImageConvertWorker(self.filePathIn, self.filePathOut, self.outType, ico_sizes, sharpen, jpeg)
+        self.worker.progress_changed.connect(self.updateBar)
+        self.worker.succeeded.connect(self.onConvertSuccess)
+        self.worker.failed.connect(self.onConvertError)
+        self.worker.cancelled.connect(self.onConvertCancelled)
+        self.worker.start()
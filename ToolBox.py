@@ -1,3 +1,4 @@
+import multiprocessing
 import sys
 
 from PyQt5.QtCore import QCoreApplication, Qt
@@ -64,13 +65,17 @@ class Toolbox(SplitFluentWindow):
         self.apply_theme_by_switch(is_dark)
 
 
-setThemeColor('')
-setTheme(Theme.AUTO)
+if __name__ == '__main__':
+    # PDF 压缩会启动进程池；Windows 下子进程会重新导入主模块，必须有入口保护，打包后还需 freeze_support
+    multiprocessing.freeze_support()
 
-QCoreApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
-QApplication.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
-app = QApplication(sys.argv)
-tb = Toolbox()
-tb.resize(400, 300)
-tb.show()
-app.exec_()
+    setThemeColor('')
+    setTheme(Theme.AUTO)
+
+    QCoreApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+    QApplication.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
+    app = QApplication(sys.argv)
+    tb = Toolbox()
+    tb.resize(400, 300)
+    tb.show()
+    app.exec_()
@@ -0,0 +1,152 @@
+"""离线生成基准测试用的合成 PDF 与图片，不依赖任何外部样本文件。
+
+PDF 类型：
+    text  纯文字页（可复制文字，矢量内容）
+    scan  每页一张整页噪点扫描图，模拟扫描件
+    mixed 文字 + 页面中部一张照片，与 benchmarks.pixmap_to_pil 原有样本一致
+    colorspaces 文字 + 灰度 JPEG、灰度 PNG、CMYK JPEG 与 RGB JPEG 各一张，覆盖非 RGB 图片的处理路径
+
+动画：渐变背景上移动的色块，保存为 GIF 或 APNG。
+"""
+import random
+from io import BytesIO
+from pathlib import Path
+
+import fitz
+from PIL import Image, ImageDraw
+
+PDF_KINDS = ('text', 'scan', 'mixed', 'colorspaces')
+# (宽, 高, 模式)：覆盖小图标到大照片，以及带透明通道、灰度与调色板图片
+IMAGE_SPECS = ((256, 256, 'RGBA'), (1024, 768, 'RGB'), (2048, 1536, 'RGB'), (1600, 1200, 'L'), (800, 600, 'P'))
+ANIMATION_SIZE = (320, 240)
+
+_LOREM = ('Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+          'incididunt ut labore et dolore magna aliqua').split()
+
+
+def _jpeg(image: Image.Image, quality: int = 85) -> bytes:
+    buf = BytesIO()
+    image.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def _png(image: Image.Image) -> bytes:
+    buf = BytesIO()
+    image.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _add_text(page: fitz.Page, rng: random.Random, top: float = 72, bottom: float = 770):
+    y = top
+    while y < bottom:
+        page.insert_text((72, y), ' '.join(rng.choices(_LOREM, k=10)), fontsize=11)
+        y += 16
+
+
+def _scan_image(rng: random.Random, size: tuple[int, int]) -> Image.Image:
+    # 偏灰的纸张底色 + 噪点 + 若干深色横条模拟文字行
+    image = Image.merge('RGB', [Image.effect_noise(size, 24).point(lambda v: min(255, v + 150))] * 3)
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for y in range(height // 12, height - height // 12, height // 40):
+        draw.rectangle((width // 10, y, width // 10 + rng.randint(width // 2, width * 8 // 10), y + height // 120),
+                       fill=(40, 40, 40))
+    return image
+
+
+def make_pdf(kind: str = 'mixed', pages: int = 10, seed: int = 0) -> fitz.Document:
+    """在内存中生成一份 kind 类型、pages 页的 PDF。"""
+    if kind not in PDF_KINDS:
+        raise ValueError(f'不支持的PDF类型：{kind}')
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        if kind == 'text':
+            _add_text(page, rng)
+        elif kind == 'scan':
+            page.insert_image(page.rect, stream=_jpeg(_scan_image(rng, (1240, 1754)), quality=80))
+        elif kind == 'colorspaces':
+            page.insert_text((72, 72), f'Color space page {i}', fontsize=18)
+            gray = Image.effect_noise((800, 600), 48)
+            streams = (_jpeg(gray), _png(gray), _jpeg(gray.convert('RGB').convert('CMYK')),
+                       _jpeg(Image.merge('RGB', (gray, gray.rotate(180), gray.transpose(Image.FLIP_LEFT_RIGHT)))))
+            for k, stream in enumerate(streams):
+                # 2x2 排布，每张约 200 DPI，高于常用的目标分辨率，会被降采样
+                x, y = 72 + (k % 2) * 234, 100 + (k // 2) * 180
+                page.insert_image(fitz.Rect(x, y, x + 216, y + 162), stream=stream)
+            _add_text(page, rng, top=480)
+        else:
+            page.insert_text((72, 72), f'Benchmark page {i}', fontsize=18)
+            noise = Image.effect_noise((1200, 900), 48).convert('RGB')
+            page.insert_image(fitz.Rect(72, 100, 523, 438), stream=_jpeg(noise))
+            _add_text(page, rng, top=470)
+    return doc
+
+
+def write_pdf(path: Path, kind: str, pages: int, seed: int = 0) -> Path:
+    """生成 PDF 并保存到 path；文件已存在时直接复用。"""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with make_pdf(kind, pages, seed) as doc:
+            doc.save(str(path), garbage=3, deflate=True)
+    return path
+
+
+def make_image(width: int, height: int, mode: str, seed: int = 0) -> Image.Image:
+    """生成一张带渐变与噪点的图片，兼顾可压缩区域与细节。"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 32)
+    image = Image.merge('RGB', (gradient, noise, gradient.rotate(90).resize((width, height))))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.ellipse((x, y, x + width // 8, y + height // 8), fill=tuple(rng.randrange(256) for _ in range(3)))
+    if mode == 'RGBA':
+        image.putalpha(gradient)
+        return image
+    if mode == 'P':
+        return image.quantize(colors=64)
+    return image.convert(mode)
+
+
+def write_image(path: Path, width: int, height: int, mode: str, seed: int = 0) -> Path:
+    """生成 PNG 图片并保存到 path；文件已存在时直接复用。"""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        make_image(width, height, mode, seed).save(str(path), format='PNG')
+    return path
+
+
+def make_frames(frames: int, size: tuple[int, int] = ANIMATION_SIZE, seed: int = 0) -> list[Image.Image]:
+    """生成动画帧：每帧只有色块位置变化，帧间差异与常见动图相近；各帧为共用同一调色板的索引色图片。"""
+    rng = random.Random(seed)
+    width, height = size
+    background = Image.merge('RGB', (Image.linear_gradient('L').resize(size),
+                                     Image.linear_gradient('L').rotate(90).resize(size),
+                                     Image.new('L', size, 128))).quantize(252)
+    # 调色板末尾 4 个下标留给色块
+    palette = background.getpalette()[:252 * 3]
+    for _ in range(4):
+        palette += [rng.randrange(256) for _ in range(3)]
+    background.putpalette(palette)
+    images = []
+    for i in range(frames):
+        frame = background.copy()
+        draw = ImageDraw.Draw(frame)
+        for k in range(4):
+            x = (i * (k + 2) * 3) % width
+            y = height * (k + 1) // 5
+            draw.rectangle((x, y, x + width // 10, y + height // 10), fill=252 + k)
+        images.append(frame)
+    return images
+
+
+def write_animation(path: Path, frames: int, seed: int = 0) -> Path:
+    """生成 frames 帧的动画并按扩展名保存为 GIF 或 APNG；文件已存在时直接复用。"""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        images = make_frames(frames, seed=seed)
+        images[0].save(str(path), save_all=True, append_images=images[1:], duration=40, loop=0)
+    return path
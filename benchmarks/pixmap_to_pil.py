@@ -0,0 +1,47 @@
+"""对比页面位图转 PIL 图像的两种方式：PNG 编码/解码往返 与 直接引用 pixmap 缓冲区。
+
+用法：python -m benchmarks.pixmap_to_pil [--pages 10] [--dpi 150 200 300]
+"""
+import argparse
+import time
+from io import BytesIO
+
+import fitz
+from PIL import Image
+
+from benchmarks.fixtures import make_pdf
+from services.pdf_service import _pixmap_to_image
+
+
+def _via_png(pix: fitz.Pixmap) -> Image.Image:
+    image = Image.open(BytesIO(pix.pil_tobytes(format='png')))
+    image.load()
+    return image
+
+
+def _via_buffer(pix: fitz.Pixmap) -> Image.Image:
+    image = _pixmap_to_image(pix)
+    image.load()
+    return image
+
+
+def run(pages: int, dpis: list[int]):
+    with make_pdf('mixed', pages) as doc:
+        print(f'{"dpi":>5} {"png 往返 ms/页":>16} {"缓冲区 ms/页":>14} {"加速比":>8}')
+        for dpi in dpis:
+            pixmaps = [page.get_pixmap(dpi=dpi) for page in doc]
+            timings = {}
+            for name, convert in (('png', _via_png), ('buffer', _via_buffer)):
+                start = time.perf_counter()
+                for pix in pixmaps:
+                    convert(pix).quantize(colors=256, method=2)
+                timings[name] = (time.perf_counter() - start) / len(pixmaps) * 1000
+            print(f'{dpi:>5} {timings["png"]:>16.1f} {timings["buffer"]:>14.1f} {timings["png"] / timings["buffer"]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--dpi', type=int, nargs='+', default=[150, 200, 300])
+    args = parser.parse_args()
+    run(args.pages, args.dpi)
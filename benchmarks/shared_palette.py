@@ -0,0 +1,61 @@
+"""对比每页独立调色板与共享调色板的量化耗时和画质。
+
+用法：python -m benchmarks.shared_palette [--pdf 文件] [--dpi 150] [--method 0] [--sample 8]
+不指定 --pdf 时使用合成的测试文档；画质以量化前后的平均绝对误差与 PSNR 衡量。
+"""
+import argparse
+import math
+import time
+
+import fitz
+from PIL import ImageChops, ImageStat
+
+from benchmarks.fixtures import make_pdf
+from services.pdf_service import _RasterOptions, _pixmap_to_image, _quantize, build_shared_palette
+
+
+def _error(original, quantized) -> tuple[float, float]:
+    stat = ImageStat.Stat(ImageChops.difference(original, quantized.convert('RGB')))
+    mae = sum(stat.mean) / len(stat.mean)
+    rms = math.sqrt(sum(v * v for v in stat.rms) / len(stat.rms))
+    psnr = float('inf') if rms == 0 else 20 * math.log10(255 / rms)
+    return mae, psnr
+
+
+def run(doc: fitz.Document, dpi: int, method: int, sample: int):
+    start = time.perf_counter()
+    palette = build_shared_palette(doc, sample, method)
+    palette_cost = time.perf_counter() - start
+
+    modes = {
+        '每页调色板': _RasterOptions(dpi=dpi, method=method),
+        '共享调色板': _RasterOptions(dpi=dpi, method=method, palette=palette),
+    }
+    results = {name: {'time': 0.0, 'mae': 0.0, 'psnr': 0.0} for name in modes}
+    for page in doc:
+        pix = page.get_pixmap(dpi=dpi)
+        image = _pixmap_to_image(pix)
+        for name, options in modes.items():
+            start = time.perf_counter()
+            quantized = _quantize(image, options)
+            results[name]['time'] += time.perf_counter() - start
+            mae, psnr = _error(image, quantized)
+            results[name]['mae'] += mae
+            results[name]['psnr'] += psnr
+
+    pages = len(doc)
+    print(f'{pages} 页，{dpi} DPI，method={method}，共享调色板抽样 {sample} 页（构建耗时 {palette_cost * 1000:.0f} ms）')
+    print(f'{"方式":<8} {"量化 ms/页":>10} {"平均误差":>8} {"PSNR dB":>8}')
+    for name, r in results.items():
+        print(f'{name:<8} {r["time"] / pages * 1000:>10.1f} {r["mae"] / pages:>8.2f} {r["psnr"] / pages:>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pdf')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--method', type=int, default=0)
+    parser.add_argument('--sample', type=int, default=8)
+    args = parser.parse_args()
+    with (fitz.open(args.pdf) if args.pdf else make_pdf('mixed', 10)) as document:
+        run(document, args.dpi, args.method, args.sample)
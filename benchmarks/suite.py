@@ -0,0 +1,233 @@
+"""PDF 与图片服务的基准测试套件：按参数网格运行并把结果写成 JSON，便于跨版本对比。
+
+用法：
+    python -m benchmarks.suite [--quick] [--out 结果.json] [--compare 旧结果.json]
+    python -m benchmarks.suite --compare 旧结果.json --against 新结果.json
+
+每个用例在独立子进程中运行，以便准确记录该用例的峰值内存（RSS）。
+记录指标：墙钟耗时、每秒页数（图片用例为每秒张数，动画用例为每秒帧数）、峰值 RSS、输出大小与输入大小之比。
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+GRIDS = {
+    'full': {
+        'pages': (4, 16),
+        'dpi': (72, 150, 300),
+        'method': (0, 2),
+        'encoder': ('rgb', 'auto'),
+        'formats': ('jpg', 'png', 'bmp', 'gif', 'ico'),
+        # 动画逐帧转换：对比不同帧数下的峰值内存，应基本持平
+        'anim_frames': (100, 1000),
+    },
+    'quick': {
+        'pages': (4,),
+        'dpi': (150,),
+        'method': (2,),
+        'encoder': ('rgb',),
+        'formats': ('jpg', 'bmp'),
+        'anim_frames': (100,),
+    },
+}
+
+
+def _peak_rss_kb() -> int | None:
+    """当前进程的峰值 RSS，单位 KB；无法获取时返回 None。"""
+    # Linux 上 ru_maxrss 会跨 exec 继承父进程的值，优先读取 exec 后重新计数的 VmHWM
+    status = Path('/proc/self/status')
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 上 ru_maxrss 以字节为单位，Linux 上以 KB 为单位
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) // 1024
+
+
+def _run_case(case: dict) -> dict:
+    """在子进程中执行单个用例并返回指标。"""
+    source = Path(case['input'])
+    out_dir = Path(case['out_dir'])
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    if case['service'] == 'compress_pdf':
+        from services.pdf_service import compress_pdf
+        output = Path(compress_pdf(str(source), str(out_dir), case['dpi'], method=case['method'],
+                                   workers=case.get('workers', 1), encoder=case['encoder']))
+    elif case['service'] == 'recompress_pdf_images':
+        from services.pdf_service import recompress_pdf_images
+        output = Path(recompress_pdf_images(str(source), str(out_dir), case['dpi']))
+    elif case['service'] == 'pdf_compress':
+        from pdf import pdf_compress
+        pdf_compress(str(source), _dpi=case['dpi'], method=case['method'])
+        output = Path(f"{str(source).rsplit('.')[0]}_by_{case['dpi']}dpi.pdf")
+    elif case['service'] == 'convert_image':
+        from PIL import Image
+        from services.image_service import convert_image
+        with Image.open(source) as image:
+            output = Path(convert_image(image, str(source), str(out_dir), case['format']))
+    elif case['service'] == 'convert_image_file':
+        from services.image_service import convert_image_file
+        output = Path(convert_image_file(str(source), str(out_dir), case['format']))
+    else:
+        raise ValueError(f"未知的服务：{case['service']}")
+    wall = time.perf_counter() - start
+
+    output_size = output.stat().st_size
+    if case['service'] == 'pdf_compress':
+        output.unlink()
+    units = case.get('pages') or case.get('frames', 1)
+    return {
+        'wall_s': round(wall, 4),
+        'units_per_s': round(units / wall, 3) if wall else None,
+        'peak_rss_kb': _peak_rss_kb(),
+        'input_bytes': source.stat().st_size,
+        'output_bytes': output_size,
+        'output_ratio': round(output_size / source.stat().st_size, 4),
+    }
+
+
+def _cases(grid: dict, workdir: Path) -> list[dict]:
+    # 只在父进程中导入：避免子进程因加载 fitz 而抬高图片用例的峰值内存
+    from benchmarks.fixtures import IMAGE_SPECS, PDF_KINDS, write_animation, write_image, write_pdf
+
+    fixtures = workdir / 'fixtures'
+    cases = []
+    for kind, pages in itertools.product(PDF_KINDS, grid['pages']):
+        pdf_path = write_pdf(fixtures / f'{kind}{pages}' / f'{kind}_{pages}p.pdf', kind, pages)
+        for dpi, method in itertools.product(grid['dpi'], grid['method']):
+            for encoder in grid['encoder']:
+                cases.append({'service': 'compress_pdf', 'input': str(pdf_path), 'kind': kind, 'pages': pages,
+                              'dpi': dpi, 'method': method, 'encoder': encoder})
+            cases.append({'service': 'pdf_compress', 'input': str(pdf_path), 'kind': kind, 'pages': pages,
+                          'dpi': dpi, 'method': method})
+        for dpi in grid['dpi']:
+            cases.append({'service': 'recompress_pdf_images', 'input': str(pdf_path), 'kind': kind, 'pages': pages,
+                          'dpi': dpi})
+    for width, height, mode in IMAGE_SPECS:
+        image_path = write_image(fixtures / f'{width}x{height}_{mode}.png', width, height, mode)
+        for out_format in grid['formats']:
+            # 同一编码的转换直接复制字节，测的只是文件复制，不计入网格
+            if out_format == image_path.suffix[1:]:
+                continue
+            cases.append({'service': 'convert_image', 'input': str(image_path), 'kind': f'{width}x{height} {mode}',
+                          'format': out_format})
+    # GIF 转 APNG、APNG 转 GIF，两个方向都走逐帧流式路径
+    for frames in grid['anim_frames']:
+        for source, out_format in (('gif', 'png'), ('png', 'gif')):
+            anim_path = write_animation(fixtures / f'anim_{frames}f.{source}', frames)
+            cases.append({'service': 'convert_image_file', 'input': str(anim_path), 'kind': f'{source} {frames}f',
+                          'frames': frames, 'format': out_format})
+    for i, case in enumerate(cases):
+        case['out_dir'] = str(workdir / 'out' / str(i))
+    return cases
+
+
+def _case_key(case: dict) -> str:
+    keys = ('service', 'kind', 'pages', 'dpi', 'method', 'encoder', 'format')
+    return ' '.join(f'{key}={case[key]}' for key in keys if key in case)
+
+
+def run(grid_name: str, workdir: Path, repeat: int) -> dict:
+    cases = _cases(GRIDS[grid_name], workdir)
+    results = []
+    for i, case in enumerate(cases, start=1):
+        runs = []
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--case', json.dumps(case)],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                runs = None
+                print(f'[{i}/{len(cases)}] {_case_key(case)} 失败：{proc.stderr.strip().splitlines()[-1:]}')
+                break
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if not runs:
+            results.append({'key': _case_key(case), 'error': True})
+            continue
+        # 多次运行取耗时最短的一次，减少系统噪声的影响
+        best = min(runs, key=lambda r: r['wall_s'])
+        best['peak_rss_kb'] = max((r['peak_rss_kb'] or 0) for r in runs) or None
+        results.append({'key': _case_key(case), **{k: v for k, v in case.items() if k not in ('input', 'out_dir')},
+                        **best})
+        print(f"[{i}/{len(cases)}] {_case_key(case)}: {best['wall_s']:.3f}s, {best['units_per_s']}/s, "
+              f"RSS {best['peak_rss_kb']} KB, 比例 {best['output_ratio']}")
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'grid': grid_name,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict):
+    """逐用例对比两次结果：耗时与峰值内存的变化百分比（负数表示更快/更省）。"""
+    old = {r['key']: r for r in baseline['results'] if not r.get('error')}
+    print(f'{"用例":<70} {"耗时变化":>9} {"内存变化":>9} {"比例变化":>9}')
+    for r in current['results']:
+        base = old.get(r['key'])
+        if r.get('error') or base is None:
+            continue
+
+        def delta(field):
+            if not base.get(field) or r.get(field) is None:
+                return '-'
+            return f'{(r[field] - base[field]) / base[field] * 100:+.1f}%'
+
+        print(f"{r['key']:<70} {delta('wall_s'):>9} {delta('peak_rss_kb'):>9} {delta('output_ratio'):>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='只运行最小的参数网格')
+    parser.add_argument('--repeat', type=int, default=1, help='每个用例重复次数，取最快一次')
+    parser.add_argument('--workdir', help='测试文件目录，默认使用临时目录')
+    parser.add_argument('--out', help='结果 JSON 路径，默认写入 benchmarks/results/')
+    parser.add_argument('--compare', help='与之对比的旧结果 JSON')
+    parser.add_argument('--against', help='与 --compare 配合：直接对比两份已有结果，不重新运行')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(_run_case(json.loads(args.case))))
+        sys.exit(0)
+
+    if args.compare and args.against:
+        compare(json.loads(Path(args.compare).read_text(encoding='utf-8')),
+                json.loads(Path(args.against).read_text(encoding='utf-8')))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run('quick' if args.quick else 'full', Path(args.workdir or tmp), args.repeat)
+
+    out_path = Path(args.out) if args.out else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f'结果已写入：{out_path}')
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding='utf-8')), report)
@@ -1,9 +1,22 @@
-from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 import fitz
 from PIL import Image
 from tqdm import tqdm
 
-def pdf_compress(_pdf, _dpi=150, _type="png", method=0):
+def _compress_range(_pdf, start, stop, _dpi, _type, method):
+    '''
+    子进程中执行：自行打开文档，压缩 [start, stop) 区间内的页面并按页码顺序返回
+    '''
+    pages = []
+    with fitz.open(_pdf) as doc:
+        for i in range(start, stop):
+            img = doc[i].get_pixmap(dpi=_dpi)
+            image = Image.frombuffer('RGB', (img.width, img.height), img.samples_mv, 'raw', 'RGB', img.stride, 1)
+            pages.append(image.quantize(colors=256, method=method).convert('RGB'))
+    return pages
+
+
+def pdf_compress(_pdf, _dpi=150, _type="png", method=0, _workers=1):
     '''
     本方法适用于纯图片型（包含文字型图片）的PDF文档压缩，可复制型的文字类的PDF文档不建议使用本方法
     :param _pdf: 文件名全路径
@@ -12,26 +25,41 @@ def pdf_compress(_pdf, _dpi=150, _type="png", method=0):
                         300dpi，压缩率约为30-50%，即原来大小的30-50%，基本无损，看不出来压缩后导致的分辨率差异
                         200dpi，压缩率约为20-30%，轻微有损
                         150dpi，压缩率约为5-10%，有损，但是基本不影响图片形文字的阅读
-    :param _type: 保存格式，默认为png，其他：JPEG, PNM, PGM, PPM, PBM, PAM, PSD, PS
+    :param _type: 保留参数，兼容旧调用；页面现已直接从pixmap像素缓冲区转为图片，不再经过中间格式编码
     :param method:  int，图像压缩方法，只支持下面3个选项，默认值是0
                 0 : `MEDIANCUT` (median cut)
                 1 : `MAXCOVERAGE` (maximum coverage)
                 2 : `FASTOCTREE` (fast octree)
+    :param _workers: 并行进程数，默认1（单进程逐页处理），大于1时按页码区间分给多个进程并行压缩
     :return:
     '''
     merges = []
     _file = None
-    with fitz.open(_pdf) as doc:
-        for i, page in tqdm(enumerate(doc.pages(), start=0) , desc="压缩处理中，请耐心等待"):
-            img = page.get_pixmap(dpi=_dpi)             # 将PDF页面转化为图片
-            img_bytes = img.pil_tobytes(format=_type)   # 将图片转为为bytes对象
-            image = Image.open(BytesIO(img_bytes))      # 将bytes对象转为PIL格式的图片对象
-            if i == 0:
-                _file = image                           # 取第一张图片用于创建PDF文档的首页
-            pix: Image.Image = image.quantize(colors=256, method=method).convert('RGB')    # 单张图片压缩处理
-            merges.append(pix)                          # 组装pdf
-            # tqdm.write(f"\n{i} | success reduced  page: {i}.{_type}")
-    
+    if _workers > 1:
+        with fitz.open(_pdf) as doc:
+            total = len(doc)
+        chunk = max(1, min(8, total // (_workers * 4)))
+        starts = list(range(0, total, chunk))
+        with ProcessPoolExecutor(max_workers=_workers) as pool, tqdm(total=total, desc="压缩处理中，请耐心等待") as bar:
+            # map 按提交顺序返回结果，页码顺序不会乱
+            for pages in pool.map(_compress_range,
+                                  [_pdf] * len(starts), starts, [min(s + chunk, total) for s in starts],
+                                  [_dpi] * len(starts), [_type] * len(starts), [method] * len(starts)):
+                merges.extend(pages)
+                bar.update(len(pages))
+        _file = merges[0] if merges else None
+    else:
+        with fitz.open(_pdf) as doc:
+            for i, page in tqdm(enumerate(doc.pages(), start=0) , desc="压缩处理中，请耐心等待"):
+                img = page.get_pixmap(dpi=_dpi)             # 将PDF页面转化为图片
+                # 直接引用pixmap的像素缓冲区构造PIL图片，不再经过PNG编码/解码
+                image = Image.frombuffer('RGB', (img.width, img.height), img.samples_mv, 'raw', 'RGB', img.stride, 1)
+                if i == 0:
+                    _file = image.copy()                    # 取第一张图片用于创建PDF文档的首页（复制一份，不依赖pixmap缓冲区）
+                pix: Image.Image = image.quantize(colors=256, method=method).convert('RGB')    # 单张图片压缩处理
+                merges.append(pix)                          # 组装pdf
+                # tqdm.write(f"\n{i} | success reduced  page: {i}.{_type}")
+
 
     _file.save(f"{_pdf.rsplit('.')[0]}_by_{_dpi}dpi.pdf",####################路径
                "pdf",                                   # 用PIL自带的功能保存为PDF格式文件
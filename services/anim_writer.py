@@ -0,0 +1,143 @@
+"""流式动画写入器：逐帧编码并写入 GIF / APNG，内存中只保留当前帧与上一帧，占用与帧数无关。"""
+import struct
+import zlib
+from io import BytesIO
+from typing import BinaryIO
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _index_view(image: Image.Image) -> Image.Image:
+    # 索引色图片按下标逐字节比较：同一调色板下下标相同即颜色相同
+    return Image.frombytes('L', image.size, image.tobytes())
+
+
+class StreamingGifWriter:
+    """每调用一次 add_frame 就把该帧写入文件，最后由 close 写入结束符。
+
+    所有帧共用第一帧量化得到的全局调色板（保留一个下标作透明色），不再逐帧写局部调色板；
+    与上一帧相比只有局部变化的帧只写入变化区域。
+    帧的处置方式（disposal）要看下一帧是否含透明像素才能确定，因此每帧推迟到下一帧到来时才写出。
+    """
+
+    def __init__(self, fp: BinaryIO, first_frame: Image.Image, loop: int | None = 0):
+        """first_frame 为 RGBA 帧，用来生成全局调色板；loop 为 None 时只播放一次。"""
+        self._fp = fp
+        self.size = first_frame.size
+        # 量化用的调色板不含透明色，否则不透明像素可能被映射到透明下标上
+        self._palette_image = first_frame.convert('RGB').quantize(255)
+        palette = self._palette_image.getpalette()
+        self._transparent_index = len(palette) // 3
+        header_image = self._palette_image.copy()
+        header_image.putpalette(palette + [0, 0, 0])
+        header_image.info['version'] = b'89a'
+        self._previous: Image.Image | None = None
+        self._pending: tuple[Image.Image, tuple[int, int, int, int], float, bool] | None = None
+        self.frame_count = 0
+
+        # 背景色指向透明下标：部分解码器按背景色（而非透明）清空 disposal=2 的区域
+        header, _ = GifImagePlugin.getheader(header_image, info={'optimize': False, 'loop': loop,
+                                                                 'background': self._transparent_index})
+        for block in header:
+            self._fp.write(block)
+
+    def add_frame(self, frame: Image.Image, duration: float = 100):
+        """frame 为与画布同尺寸的 RGBA 完整帧，duration 单位为毫秒。"""
+        # 不做误差扩散：抖动噪点逐帧不同，既会闪烁，也让只写变化区域失效
+        indexed = frame.convert('RGB').quantize(palette=self._palette_image, dither=Image.Dither.NONE)
+        transparent = frame.getchannel('A').point(lambda a: 255 if a < 128 else 0, '1')
+        has_transparency = transparent.getbbox() is not None
+        if has_transparency:
+            indexed.paste(self._transparent_index, mask=transparent)
+
+        box = (0, 0) + self.size
+        # 透明帧要求上一帧显示后清空画布（disposal=2），只能写完整帧
+        if self._previous is not None and not has_transparency:
+            # 与上一帧完全相同时仍写入 1x1 的区域，保持帧数与时长不变
+            box = ImageChops.difference(_index_view(self._previous), _index_view(indexed)).getbbox() or (0, 0, 1, 1)
+        self._flush(clear=has_transparency)
+        self._pending = (indexed, box, duration, has_transparency)
+        self._previous = indexed
+        self.frame_count += 1
+
+    def _flush(self, clear: bool):
+        if self._pending is None:
+            return
+        frame, box, duration, has_transparency = self._pending
+        if clear:
+            # disposal 只清空该帧自身覆盖的区域，要清空整个画布就得写完整帧
+            box = (0, 0) + self.size
+        params = {'duration': duration, 'disposal': 2 if clear else 1}
+        if has_transparency or clear:
+            params['transparency'] = self._transparent_index
+        for block in GifImagePlugin.getdata(frame.crop(box), offset=box[:2], **params):
+            self._fp.write(block)
+        self._pending = None
+
+    def close(self):
+        self._flush(clear=False)
+        self._fp.write(b';')
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _png_idat(image: Image.Image, compress_level: int) -> bytes:
+    # 借助 Pillow 完成滤波与 zlib 压缩，再取出其中的 IDAT 数据
+    buf = BytesIO()
+    image.save(buf, format='PNG', compress_level=compress_level)
+    png = buf.getvalue()
+    data = []
+    pos = len(_PNG_SIGNATURE)
+    while pos < len(png):
+        length, kind = struct.unpack('>I4s', png[pos:pos + 8])
+        if kind == b'IDAT':
+            data.append(png[pos + 8:pos + 8 + length])
+        pos += length + 12
+    return b''.join(data)
+
+
+class StreamingApngWriter:
+    """逐帧写入 APNG；帧数需事先给出（写在 acTL 中），与上一帧相比只有局部变化的帧只写入变化区域。"""
+
+    def __init__(self, fp: BinaryIO, size: tuple[int, int], frame_count: int, loop: int = 0,
+                 compress_level: int = 6):
+        """loop 为播放次数，0 表示无限循环。"""
+        self._fp = fp
+        self.size = size
+        self.compress_level = compress_level
+        self._previous: Image.Image | None = None
+        self._sequence = 0
+        self.frame_count = 0
+
+        width, height = size
+        self._fp.write(_PNG_SIGNATURE)
+        self._fp.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        self._fp.write(_png_chunk(b'acTL', struct.pack('>II', frame_count, loop)))
+
+    def add_frame(self, frame: Image.Image, duration: float = 100):
+        """frame 为与画布同尺寸的 RGBA 完整帧，duration 单位为毫秒。"""
+        box = (0, 0) + self.size
+        if self._previous is not None:
+            box = ImageChops.difference(self._previous, frame).getbbox(alpha_only=False) or (0, 0, 1, 1)
+        x, y, right, bottom = box
+        # dispose_op=0 保留画布、blend_op=0 直接覆盖，因此只写变化区域即可得到完整帧
+        self._fp.write(_png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', self._sequence, right - x, bottom - y, x, y,
+                                                       min(round(duration), 0xFFFF), 1000, 0, 0)))
+        self._sequence += 1
+
+        data = _png_idat(frame.crop(box), self.compress_level)
+        if self.frame_count == 0:
+            self._fp.write(_png_chunk(b'IDAT', data))
+        else:
+            self._fp.write(_png_chunk(b'fdAT', struct.pack('>I', self._sequence) + data))
+            self._sequence += 1
+
+        self._previous = frame
+        self.frame_count += 1
+
+    def close(self):
+        self._fp.write(_png_chunk(b'IEND', b''))
@@ -1,20 +1,668 @@
+import os
+import shutil
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from io import BytesIO
 from pathlib import Path
 
-from PIL import Image
+from PIL import Image, ImageFile, ImageFilter
 
+from services.anim_writer import StreamingApngWriter, StreamingGifWriter
+from services.job_control import JobControl
 
-def convert_image(image: Image.Image, input_path: str, output_path: str, out_format: str) -> str:
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能普通复制
+    fcntl = None
+
+# 批量转换时从目录中收集的图片扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+# 输出尺寸有上限的格式：ICO 最大 256x256，JPEG 源图只需按该尺寸解码
+DECODE_BOUNDS = {'ico': (256, 256)}
+# ICO 默认包含的尺寸，与 Windows 资源管理器各视图所用的尺寸一致
+ICO_SIZES = (16, 24, 32, 48, 64, 128, 256)
+# 缩小后锐化：补偿多级缩小带来的模糊，半径较小以免小尺寸图标出现白边
+_ICON_SHARPEN = ImageFilter.UnsharpMask(radius=0.8, percent=80, threshold=2)
+# JPEG 质量搜索：SSIM 在原分辨率下均匀抽取的 4x4 个 64x64 灰度块上计算。
+# 缩小后再比较会把 8x8 的块效应平均掉，低质量也能得到很高的分数
+_SSIM_TILE = 64
+_SSIM_GRID = 4
+_SSIM_BLOCK = 8
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+# 可以保存动画的输出格式（PNG 输出为 APNG）；其余格式只保存第一帧
+ANIMATED_FORMATS = ('gif', 'png')
+
+# 按文件头魔数识别编码，不依赖扩展名
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'\x00\x00\x01\x00', 'ICO'),
+)
+# 输出扩展名对应的编码
+_FORMAT_CODECS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'gif': 'GIF', 'bmp': 'BMP', 'ico': 'ICO'}
+# Linux 上 ioctl(FICLONE) 在支持写时复制的文件系统（btrfs、xfs 等）上克隆文件，不复制数据块
+_FICLONE = 0x40049409
+
+
+@dataclass
+class ImageInfo:
+    """只读取文件头即可得到的图片信息。"""
+
+    path: str
+    format: str
+    width: int
+    height: int
+    mode: str
+    frames: int
+    file_size: int
+
+    @property
+    def megapixels(self) -> float:
+        return self.width * self.height / 1_000_000
+
+
+def probe_image(path: str) -> ImageInfo:
+    """只解析文件头，不解码像素；读取完立即关闭文件，不保留文件句柄与解码器状态。"""
+    with Image.open(path) as image:
+        # 多帧 GIF 统计帧数只需跳过各帧的数据块，不做 LZW 解码
+        frames = getattr(image, 'n_frames', 1)
+        return ImageInfo(path, image.format or '', image.width, image.height, image.mode, frames,
+                         os.path.getsize(path))
+
+
+# 自动选择色度采样时，质量不低于此值用 4:4:4 保留色彩细节，否则用 4:2:0 换取体积
+JPEG_444_QUALITY = 90
+
+
+@dataclass
+class JpegOptions:
+    """JPEG 编码参数；给出 target_bytes 或 min_ssim 时在 [min_quality, max_quality] 内搜索质量。
+
+    subsampling 取 Pillow 的写法：'4:4:4'、'4:2:2'、'4:2:0'，None 表示按质量自动选择
+    （不低于 JPEG_444_QUALITY 时 4:4:4，否则 4:2:0）。
+    """
+
+    quality: int = 85
+    target_bytes: int | None = None
+    min_ssim: float | None = None
+    optimize: bool = True
+    progressive: bool = False
+    subsampling: str | None = None
+    min_quality: int = 10
+    max_quality: int = 95
+
+
+@dataclass
+class JpegEncodeResult:
+    """最终采用的编码参数与结果；met 为 False 表示在质量范围内达不到目标大小或 SSIM 下限。"""
+
+    quality: int
+    size: int
+    ssim: float | None
+    tries: int
+    optimize: bool
+    progressive: bool
+    subsampling: str
+    met: bool = True
+
+
+@dataclass
+class ConversionPlan:
+    """转换方式：copy 原样复制字节，wrap_ico 把 PNG 直接封装进 ICO 容器，transcode 解码后重新编码。"""
+
+    action: str
+    source_codec: str | None
+    target_codec: str
+
+
+def sniff_codec(path: str) -> str | None:
+    """读取文件开头的魔数判断编码，无法识别时返回 None。"""
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    for magic, codec in _SIGNATURES:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def _png_header(path: str) -> tuple[int, int, int, int]:
+    """读取 PNG 的 IHDR，返回 (宽, 高, 位深, 颜色类型)。"""
+    with open(path, 'rb') as f:
+        head = f.read(33)
+    if len(head) < 33 or head[12:16] != b'IHDR':
+        raise ValueError("PNG 文件头已损坏")
+    return struct.unpack('>IIBB', head[16:26])
+
+
+def plan_conversion(input_path: str, out_format: str, ico_sizes=None,
+                    jpeg: JpegOptions | None = None, sharpen: bool = False) -> ConversionPlan:
+    """判断转换是否真的需要处理像素：同一编码直接复制，不超过 256x256 的正方形 RGBA PNG 转 ICO 只需换容器。
+
+    PNG 转 ICO 仅当 ico_sizes（默认 ICO_SIZES）实际生成的尺寸恰好只有原图尺寸、且不锐化时才直接封装；
+    给出 jpeg 编码参数时，JPEG 转 JPEG 也要按参数重新编码。
+    """
+    target = _FORMAT_CODECS.get(out_format.lower())
+    if target is None:
+        return ConversionPlan('transcode', None, out_format.upper())
+    source = sniff_codec(input_path)
+    if source == target and not (target == 'JPEG' and jpeg is not None):
+        return ConversionPlan('copy', source, target)
+    if source == 'PNG' and target == 'ICO' and not sharpen:
+        width, height, bit_depth, color_type = _png_header(input_path)
+        # 图标读取方普遍只认正方形、8 位深的 RGBA PNG（颜色类型 6），灰度、调色板等其他格式仍需重新编码
+        if (width == height <= 256 and bit_depth == 8 and color_type == 6
+                and _icon_sizes(width, ico_sizes or ICO_SIZES) == [width]):
+            return ConversionPlan('wrap_ico', source, target)
+    return ConversionPlan('transcode', source, target)
+
+
+def _clone_file(input_path: str, part_path: Path, hardlink: bool):
+    if hardlink:
+        try:
+            os.link(input_path, part_path)
+            return
+        except OSError:
+            # 跨分区或文件系统不支持硬链接时退回复制
+            pass
+    if fcntl is not None:
+        try:
+            with open(input_path, 'rb') as src, open(part_path, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(input_path, part_path)
+
+
+def _wrap_png_as_ico(input_path: str, part_path: Path):
+    # ICO 目录项可以直接存放 PNG 数据（Windows Vista 起支持），无需解码
+    # plan_conversion 只对 8 位深的 RGBA PNG 走此路径，目录项位深固定为 32
+    width, height, _, _ = _png_header(input_path)
+    size = os.path.getsize(input_path)
+    with open(part_path, 'wb') as dst, open(input_path, 'rb') as src:
+        # ICONDIR：保留字段、类型 1（图标）、图片数 1；ICONDIRENTRY 中宽高 256 记作 0
+        dst.write(struct.pack('<HHH', 0, 1, 1))
+        dst.write(struct.pack('<BBBBHHII', width % 256, height % 256, 0, 0, 1, 32, size, 6 + 16))
+        shutil.copyfileobj(src, dst)
+
+
+def _apply_plan(plan: ConversionPlan, input_path: str, target_path: Path, hardlink: bool = False) -> str:
+    """执行不需要解码的转换（copy / wrap_ico），先写临时文件再替换。"""
+    if plan.action == 'copy' and os.path.exists(target_path) and os.path.samefile(input_path, target_path):
+        # 输出就是源文件本身（同格式、同目录），无需任何操作
+        return str(target_path)
+    part_path = target_path.with_name(target_path.name + '.part')
+    part_path.unlink(missing_ok=True)
+    try:
+        if plan.action == 'copy':
+            _clone_file(input_path, part_path, hardlink)
+        else:
+            _wrap_png_as_ico(input_path, part_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, target_path)
+    return str(target_path)
+
+
+def _target_path(input_path: str, output_path: str, out_format: str) -> Path:
     source = Path(input_path)
     target_dir = Path(output_path) if output_path else source.parent
-    target_path = target_dir / f"{source.stem}.{out_format}"
+    return target_dir / f"{source.stem}.{out_format}"
 
+
+def _prepare_image(image: Image.Image, out_format: str) -> tuple[Image.Image, dict]:
     image_to_save = image
     if image_to_save.format == 'PNG' and out_format in ('jpg', 'jpeg'):
         image_to_save = image_to_save.convert('RGB')
 
-    save_kwargs = {}
-    if out_format == 'ico':
-        save_kwargs['format'] = 'ICO'
+    return image_to_save, {}
+
+
+def _icon_sizes(longest: int, sizes) -> list[int]:
+    """图片长边为 longest 时实际输出的图标尺寸（从大到小）。"""
+    return sorted({size for size in sizes if size <= longest}, reverse=True) or [min(longest, 256)]
+
+
+def build_icon_pyramid(image: Image.Image, sizes=ICO_SIZES, sharpen: bool = False) -> list[Image.Image]:
+    """按从大到小的顺序生成各尺寸的正方形 RGBA 图标。
+
+    先逐级减半（每一级都由上一级缩小而来，2x2 平均即可，开销很小），
+    每个尺寸只在最接近且不小于它的那一级上做一次 LANCZOS 缩放；非正方形图片居中放在透明画布上。
+    大于原图的尺寸会被忽略，全部大于原图时只输出一张原图长边尺寸的图标。
+    """
+    level = image.convert('RGBA')
+    longest = max(level.size)
+    icons = []
+    for size in _icon_sizes(longest, sizes):
+        while max(level.size) // 2 >= size:
+            level = level.reduce(2)
+        scale = size / max(level.size)
+        fitted = level
+        if scale != 1:
+            fitted = level.resize((max(1, round(level.width * scale)), max(1, round(level.height * scale))),
+                                  Image.Resampling.LANCZOS)
+        if sharpen:
+            fitted = fitted.filter(_ICON_SHARPEN)
+        icon = fitted
+        if fitted.size != (size, size):
+            icon = Image.new('RGBA', (size, size))
+            icon.paste(fitted, ((size - fitted.width) // 2, (size - fitted.height) // 2))
+        icons.append(icon)
+    return icons
+
+
+def _save_icon(image: Image.Image, path: Path, sizes=ICO_SIZES, sharpen: bool = False):
+    icons = build_icon_pyramid(image, sizes, sharpen)
+    # Pillow 按 sizes 从 append_images 中取同尺寸的图片，不再自行从最大图缩放
+    icons[0].save(str(path), format='ICO', sizes=[icon.size for icon in icons], append_images=icons[1:])
+
+
+def _ssim_boxes(size: tuple[int, int]) -> list[tuple[int, int, int, int]]:
+    """抽样区域：左上角对齐到 16 像素（JPEG 最大的 MCU），使比较块与编码块重合。"""
+    width, height = size
+    tile_w, tile_h = min(_SSIM_TILE, width), min(_SSIM_TILE, height)
+    boxes = []
+    for row in range(_SSIM_GRID):
+        for col in range(_SSIM_GRID):
+            x = int((width - tile_w) * (col + 0.5) / _SSIM_GRID) // 16 * 16
+            y = int((height - tile_h) * (row + 0.5) / _SSIM_GRID) // 16 * 16
+            boxes.append((x, y, x + tile_w, y + tile_h))
+    # 图片比抽样网格还小时各区域会重合，去重即可
+    return list(dict.fromkeys(boxes))
+
+
+def _ssim_view(image: Image.Image, boxes: list[tuple[int, int, int, int]]) -> tuple[bytes, int, int]:
+    """把各抽样区域的灰度图竖直拼成一条，返回 (像素, 宽, 高)。"""
+    tile_w, tile_h = boxes[0][2] - boxes[0][0], boxes[0][3] - boxes[0][1]
+    strip = Image.new('L', (tile_w, tile_h * len(boxes)))
+    for index, box in enumerate(boxes):
+        strip.paste(image.crop(box).convert('L'), (0, index * tile_h))
+    return strip.tobytes(), strip.width, strip.height
+
+
+def _block_sums(pixels: bytes, width: int, height: int) -> list[list[int]]:
+    """按 8x8 块累计像素和与平方和（参考图只需计算一次）。"""
+    blocks_x, blocks_y = width // _SSIM_BLOCK, height // _SSIM_BLOCK
+    sums = [[0, 0] for _ in range(blocks_x * blocks_y)]
+    for y in range(blocks_y * _SSIM_BLOCK):
+        row = y * width
+        base = y // _SSIM_BLOCK * blocks_x
+        for x in range(blocks_x * _SSIM_BLOCK):
+            v = pixels[row + x]
+            block = sums[base + x // _SSIM_BLOCK]
+            block[0] += v
+            block[1] += v * v
+    return sums
 
+
+def _ssim(reference: bytes, reference_sums: list[list[int]], pixels: bytes, width: int, height: int) -> float:
+    """按 8x8 块计算 SSIM 再取平均；抽样像素只有约 6.5 万个，纯 Python 实现即可，不依赖 numpy。"""
+    blocks_x = width // _SSIM_BLOCK
+    if not reference_sums:
+        return 1.0
+    sums = [[0, 0, 0] for _ in reference_sums]
+    for y in range(height // _SSIM_BLOCK * _SSIM_BLOCK):
+        row = y * width
+        base = y // _SSIM_BLOCK * blocks_x
+        for x in range(blocks_x * _SSIM_BLOCK):
+            a = reference[row + x]
+            b = pixels[row + x]
+            block = sums[base + x // _SSIM_BLOCK]
+            block[0] += b
+            block[1] += b * b
+            block[2] += a * b
+    n = _SSIM_BLOCK * _SSIM_BLOCK
+    total = 0.0
+    for (sum_a, sq_a), (sum_b, sq_b, prod) in zip(reference_sums, sums):
+        mean_a, mean_b = sum_a / n, sum_b / n
+        var_a = sq_a / n - mean_a * mean_a
+        var_b = sq_b / n - mean_b * mean_b
+        cov = prod / n - mean_a * mean_b
+        total += ((2 * mean_a * mean_b + _SSIM_C1) * (2 * cov + _SSIM_C2)
+                  / ((mean_a * mean_a + mean_b * mean_b + _SSIM_C1) * (var_a + var_b + _SSIM_C2)))
+    return total / len(reference_sums)
+
+
+def _save_jpeg(image: Image.Image, **save_kwargs) -> bytes:
+    buf = BytesIO()
+    try:
+        image.save(buf, **save_kwargs)
+    except OSError:
+        # optimize / progressive 时 Pillow 的输出缓冲按每像素 1 字节估算（质量 95 以下），
+        # 高质量 4:4:4 的细节丰富图片会超出而报错；按原始像素大小放大缓冲重试一次
+        if not (save_kwargs.get('optimize') or save_kwargs.get('progressive')):
+            raise
+        buf = BytesIO()
+        previous = ImageFile.MAXBLOCK
+        ImageFile.MAXBLOCK = max(previous, image.width * image.height * len(image.getbands()) + 65536)
+        try:
+            image.save(buf, **save_kwargs)
+        finally:
+            ImageFile.MAXBLOCK = previous
+    return buf.getvalue()
+
+
+def encode_jpeg(image: Image.Image, options: JpegOptions) -> tuple[bytes, JpegEncodeResult]:
+    """在内存中编码 JPEG；给出 target_bytes / min_ssim 时二分搜索质量。
+
+    target_bytes：取不超过目标大小的最高质量；min_ssim：取 SSIM 不低于下限的最低质量；
+    两者同时给出时取两者中较低的质量，即目标大小优先。
+    解码后的像素与参考图的 SSIM 统计只准备一次，各次尝试只重新编码。
+    """
+    if image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    save_kwargs = {'format': 'JPEG', 'optimize': options.optimize, 'progressive': options.progressive}
+
+    encoded: dict[int, bytes] = {}
+    scores: dict[int, float] = {}
+
+    def subsampling(quality: int) -> str:
+        if options.subsampling is not None:
+            return options.subsampling
+        return '4:4:4' if quality >= JPEG_444_QUALITY else '4:2:0'
+
+    def encode(quality: int) -> bytes:
+        # 自动采样在阈值处切换，体积与 SSIM 仍随质量单调上升，二分搜索不受影响
+        if quality not in encoded:
+            encoded[quality] = _save_jpeg(image, quality=quality, subsampling=subsampling(quality), **save_kwargs)
+        return encoded[quality]
+
+    reference = None
+    if options.min_ssim is not None:
+        boxes = _ssim_boxes(image.size)
+        reference = _ssim_view(image, boxes)
+        reference_sums = _block_sums(*reference)
+
+    def ssim(quality: int) -> float:
+        if quality not in scores:
+            with Image.open(BytesIO(encode(quality))) as decoded:
+                pixels, width, height = _ssim_view(decoded, boxes)
+            scores[quality] = _ssim(reference[0], reference_sums, pixels, width, height)
+        return scores[quality]
+
+    def search(low: int, high: int, ok) -> int:
+        # ok 在 low 处成立，且随质量升高由成立变为不成立：返回最后一个成立的质量
+        while low < high:
+            mid = (low + high + 1) // 2
+            if ok(mid):
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    low, high = options.min_quality, options.max_quality
+    quality = options.quality
+    met = True
+    if options.target_bytes is not None or options.min_ssim is not None:
+        quality = high
+        if options.min_ssim is not None:
+            # SSIM 随质量上升：最低的满足下限的质量，即最后一个不满足下限的质量再高一档
+            if ssim(low) >= options.min_ssim:
+                quality = low
+            elif ssim(high) >= options.min_ssim:
+                quality = search(low, high, lambda q: ssim(q) < options.min_ssim) + 1
+        if options.target_bytes is not None:
+            if len(encode(low)) > options.target_bytes:
+                quality, met = low, False
+            elif len(encode(quality)) > options.target_bytes:
+                quality = search(low, quality, lambda q: len(encode(q)) <= options.target_bytes)
+
+    data = encode(quality)
+    score = ssim(quality) if reference is not None else None
+    if score is not None and score < options.min_ssim:
+        met = False
+    return data, JpegEncodeResult(quality, len(data), score, len(encoded), options.optimize, options.progressive,
+                                  subsampling(quality), met)
+
+
+def _is_animated(image: Image.Image, out_format: str) -> bool:
+    return getattr(image, 'n_frames', 1) > 1 and out_format in ANIMATED_FORMATS
+
+
+def _save_animation(image: Image.Image, path: Path, out_format: str, step=None):
+    """逐帧解码并写入，同一时刻只有一帧在内存中；保留每帧时长与循环次数。"""
+    frame_count = image.n_frames
+    loop = image.info.get('loop')
+    with open(path, 'wb') as fp:
+        writer = None
+        for index in range(frame_count):
+            image.seek(index)
+            frame = image.convert('RGBA')
+            duration = image.info.get('duration', 100)
+            if writer is None:
+                if out_format == 'gif':
+                    writer = StreamingGifWriter(fp, frame, loop)
+                else:
+                    # 源文件没有循环信息时只播放一次
+                    writer = StreamingApngWriter(fp, image.size, frame_count, 1 if loop is None else loop)
+            writer.add_frame(frame, duration)
+            if step is not None:
+                step(10 + 85 * (index + 1) / frame_count)
+        writer.close()
+
+
+def convert_image(image: Image.Image, input_path: str, output_path: str, out_format: str,
+                  jpeg: JpegOptions | None = None) -> str:
+    target_path = _target_path(input_path, output_path, out_format)
+    plan = plan_conversion(input_path, out_format, jpeg=jpeg)
+    if plan.action != 'transcode':
+        # Image.open 只读了文件头，走快速路径时像素始终不会被解码
+        return _apply_plan(plan, input_path, target_path)
+    if _is_animated(image, out_format):
+        _save_animation(image, target_path, out_format)
+        return str(target_path)
+    if out_format == 'ico':
+        _save_icon(image, target_path)
+        return str(target_path)
+    if out_format in ('jpg', 'jpeg') and jpeg is not None:
+        target_path.write_bytes(encode_jpeg(image, jpeg)[0])
+        return str(target_path)
+    image_to_save, save_kwargs = _prepare_image(image, out_format)
     image_to_save.save(str(target_path), **save_kwargs)
     return str(target_path)
+
+
+def convert_image_file(input_path: str, output_path: str, out_format: str, progress_cb=None,
+                       control: JobControl | None = None, plan: ConversionPlan | None = None,
+                       hardlink: bool = False, ico_sizes=None, sharpen: bool = False,
+                       jpeg: JpegOptions | None = None, stats: dict | None = None) -> str:
+    """打开、解码、转换并保存一张图片；全部工作都在调用方线程中完成，供后台 worker 使用。
+
+    同一编码的文件直接复制（hardlink 为 True 时优先建立硬链接，此时修改输出文件会同时改动源文件），
+    不超过 256x256 的正方形 RGBA PNG 转 ICO 只封装容器，两者都不解码像素。
+    ICO 输出包含 ico_sizes 中的各尺寸（默认 ICO_SIZES），由 build_icon_pyramid 逐级缩小生成，sharpen 控制缩小后是否锐化。
+    JPG/JPEG 输出给出 jpeg 时由 encode_jpeg 编码，最终参数写入 stats['jpeg']（JpegEncodeResult）。
+    """
+    def step(value: float):
+        if control is not None:
+            control.checkpoint()
+        if progress_cb is not None:
+            progress_cb(value)
+
+    target_path = _target_path(input_path, output_path, out_format)
+    # 先写临时文件再替换，取消或出错时不会留下残缺的输出文件；临时文件的扩展名无法推断格式，需显式指定
+    part_path = target_path.with_name(target_path.name + '.part')
+    step(0)
+    plan = plan or plan_conversion(input_path, out_format, ico_sizes, jpeg, sharpen)
+    if plan.action != 'transcode':
+        output = _apply_plan(plan, input_path, target_path, hardlink)
+        step(100)
+        return output
+    with Image.open(input_path) as image:
+        step(10)
+        if _is_animated(image, out_format):
+            try:
+                _save_animation(image, part_path, out_format, step)
+            except BaseException:
+                part_path.unlink(missing_ok=True)
+                raise
+            os.replace(part_path, target_path)
+            step(100)
+            return str(target_path)
+        bound = DECODE_BOUNDS.get(out_format)
+        if out_format == 'ico' and ico_sizes:
+            bound = (max(ico_sizes), max(ico_sizes))
+        if bound is not None and image.format == 'JPEG':
+            # JPEG 可在解码时按 1/2、1/4、1/8 缩小（draft 模式），目标尺寸较小时省去大部分解码工作
+            image.draft(None, bound)
+        image.load()
+        step(60)
+        try:
+            if out_format == 'ico':
+                _save_icon(image, part_path, ico_sizes or ICO_SIZES, sharpen)
+            elif out_format in ('jpg', 'jpeg') and jpeg is not None:
+                data, result = encode_jpeg(image, jpeg)
+                part_path.write_bytes(data)
+                if stats is not None:
+                    stats['jpeg'] = result
+            else:
+                image_to_save, save_kwargs = _prepare_image(image, out_format)
+                save_kwargs.setdefault('format', Image.registered_extensions()[f'.{out_format}'])
+                step(75)
+                image_to_save.save(str(part_path), **save_kwargs)
+            step(95)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+    os.replace(part_path, target_path)
+    step(100)
+    return str(target_path)
+
+
+@dataclass
+class ImageConvertResult:
+    """单个文件的转换结果；失败时 output_path 为空，error 为错误信息。"""
+
+    input_path: str
+    output_path: str = ''
+    error: str = ''
+    seconds: float = 0.0
+    action: str = ''
+    jpeg: JpegEncodeResult | None = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+@dataclass
+class BatchConvertResult:
+    """批量转换的汇总：各文件结果（与输入顺序一致）、总耗时与输入总字节数。"""
+
+    results: list[ImageConvertResult] = field(default_factory=list)
+    seconds: float = 0.0
+    input_bytes: int = 0
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.succeeded
+
+    @property
+    def fast_path(self) -> int:
+        """无需解码、直接复制或封装的文件数。"""
+        return sum(1 for result in self.results if result.ok and result.action != 'transcode')
+
+    @property
+    def files_per_sec(self) -> float:
+        return len(self.results) / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.input_bytes / 1024 / 1024 / self.seconds if self.seconds > 0 else 0.0
+
+
+def collect_image_files(inputs: list[str] | str) -> tuple[list[str], str]:
+    """inputs 为目录时递归收集其中的图片，返回 (文件列表, 根目录)；为文件列表时原样返回，根目录为空。"""
+    if isinstance(inputs, str):
+        root = Path(inputs)
+        if not root.is_dir():
+            return [inputs], ''
+        files = sorted(str(path) for path in root.rglob('*')
+                       if path.suffix.lower() in IMAGE_EXTENSIONS and path.is_file())
+        return files, str(root)
+    return list(inputs), ''
+
+
+def _convert_one(input_path: str, out_dir: str, out_format: str, hardlink: bool = False, ico_sizes=None,
+                 sharpen: bool = False, jpeg: JpegOptions | None = None) -> ImageConvertResult:
+    # 运行在子进程中：异常转成结果返回，单个文件失败不影响整批
+    start = time.perf_counter()
+    stats = {}
+    try:
+        plan = plan_conversion(input_path, out_format, ico_sizes, jpeg, sharpen)
+        output = convert_image_file(input_path, out_dir, out_format, plan=plan, hardlink=hardlink,
+                                    ico_sizes=ico_sizes, sharpen=sharpen, jpeg=jpeg, stats=stats)
+    except Exception as exc:
+        return ImageConvertResult(input_path, error=str(exc) or type(exc).__name__, seconds=time.perf_counter() - start)
+    return ImageConvertResult(input_path, output, seconds=time.perf_counter() - start, action=plan.action,
+                              jpeg=stats.get('jpeg'))
+
+
+def convert_images(inputs: list[str] | str, output_path: str, out_format: str, workers: int | None = None,
+                   progress_cb=None, result_cb=None, control: JobControl | None = None,
+                   hardlink: bool = False, ico_sizes=None, sharpen: bool = False,
+                   jpeg: JpegOptions | None = None) -> BatchConvertResult:
+    """批量转换多个文件或整个目录，由进程池并行处理；out_format 为 ico 时即批量生成图标集。
+
+    output_path 为空时输出到各文件所在目录；inputs 为目录且指定了 output_path 时在其下保留子目录结构。
+    result_cb(序号, ImageConvertResult) 在每个文件完成时调用（完成顺序不一定与输入顺序一致）。
+    """
+    start = time.perf_counter()
+    files, root = collect_image_files(inputs)
+    if not files:
+        raise ValueError("没有找到要转换的图片")
+    workers = workers or os.cpu_count() or 1
+
+    out_dirs = []
+    for input_path in files:
+        out_dir = output_path
+        if output_path and root:
+            out_dir = os.path.join(output_path, os.path.relpath(os.path.dirname(input_path), root))
+            os.makedirs(out_dir, exist_ok=True)
+        out_dirs.append(out_dir)
+
+    results: list[ImageConvertResult | None] = [None] * len(files)
+    done = 0
+
+    def collect(index: int, result: ImageConvertResult):
+        nonlocal done
+        results[index] = result
+        done += 1
+        if result_cb is not None:
+            result_cb(index, result)
+        if progress_cb is not None:
+            progress_cb(done / len(files) * 100)
+
+    if workers <= 1:
+        for index, input_path in enumerate(files):
+            if control is not None:
+                control.checkpoint()
+            collect(index, _convert_one(input_path, out_dirs[index], out_format, hardlink, ico_sizes, sharpen,
+                                        jpeg))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_convert_one, input_path, out_dirs[index], out_format, hardlink,
+                                   ico_sizes, sharpen, jpeg): index
+                       for index, input_path in enumerate(files)}
+            try:
+                for future in as_completed(futures):
+                    if control is not None:
+                        control.checkpoint()
+                    collect(futures[future], future.result())
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    input_bytes = sum(os.path.getsize(path) for path in files if os.path.exists(path))
+    return BatchConvertResult(results, time.perf_counter() - start, input_bytes)
@@ -0,0 +1,40 @@
+"""后台任务的取消与暂停控制。"""
+import threading
+
+
+class JobCancelled(Exception):
+    """任务被用户取消。"""
+
+
+class JobControl:
+    """界面线程调用 cancel / pause / resume，任务线程在每个安全点调用 checkpoint。"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def is_paused(self) -> bool:
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 唤醒处于暂停中的任务，让它尽快在 checkpoint 处退出
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def checkpoint(self):
+        """暂停时在此阻塞，已取消时抛出 JobCancelled。"""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise JobCancelled('任务已取消')
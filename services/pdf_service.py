@@ -1,43 +1,978 @@
+import hashlib
+import json
+import math
+import os
+import time
+import zlib
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
 
 import fitz
-from PIL import Image
+from PIL import Image, ImageChops, features
 
+from services.job_control import JobControl
+from services.pdf_writer import PdfImage, StreamingPdfWriter
+from services.render_cache import RenderCache, document_hash
 
-def compress_pdf(pdf_path: str, out_dir: str, dpi: int, img_type: str = "png", method: int = 0, progress_cb=None) -> str:
+
+def _pixmap_to_image(pix: fitz.Pixmap) -> Image.Image:
+    # 只处理灰度与 RGB（可带透明通道）；其他色彩空间需先由调用方转换为 RGB
+    if pix.n - pix.alpha == 1:
+        mode = 'LA' if pix.alpha else 'L'
+    else:
+        mode = 'RGBA' if pix.alpha else 'RGB'
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, 'raw', mode, pix.stride, 1)
+
+
+@dataclass
+class _RasterOptions:
+    """栅格化压缩的参数；需要传给子进程，所以只放可序列化的简单数据。"""
+
+    dpi: int
+    method: int = 0
+    # 共享调色板（扁平的 RGB 列表），为 None 时每页单独计算调色板
+    palette: list[int] | None = None
+    # 'rgb'：量化后还原为 RGB 再存 JPEG（旧行为）；'auto'：按页面内容选择黑白/灰度/调色板/JPEG 编码
+    encoder: str = 'rgb'
+    # 渲染缓存目录、容量与源文档内容哈希；cache_dir 为 None 时不使用缓存
+    cache_dir: str | None = None
+    cache_max_bytes: int = 0
+    doc_hash: str = ''
+    # 为 True 时按页面内容逐页决定 DPI，dpi 作为上限
+    adaptive: bool = False
+    # 单页位图采样数据的字节数上限，超过时分条带渲染；0 表示不限制
+    max_render_bytes: int = 0
+
+
+@dataclass
+class _RasterPage:
+    # 与已写入的页面完全相同时为 None：跳过编码，由写入器按 digest 引用已有图片
+    image: PdfImage | None
+    width_pt: float
+    height_pt: float
+    # 分条带渲染的页面没有整页摘要，为 None
+    digest: str | None = ''
+    # 本页渲染是否命中缓存（未启用缓存时为 None），以及命中时省去渲染的采样数据字节数
+    cache_hit: bool | None = None
+    cached_bytes: int = 0
+    # 本页实际使用的渲染 DPI（自适应模式下可能低于 _RasterOptions.dpi）
+    dpi: int = 0
+    # 分条带渲染时的各条图片：(图片, x, y, 宽, 高)，单位为点，原点在页面左下角；此时 image 为 None
+    tiles: list[tuple[PdfImage, float, float, float, float]] | None = None
+
+
+def _quantize(image: Image.Image, options: _RasterOptions) -> Image.Image:
+    if options.palette is None:
+        return image.quantize(colors=256, method=options.method)
+    # 已有调色板时只需逐像素找最近颜色，省去每页构建调色板的开销
+    palette_image = Image.new('P', (1, 1))
+    palette_image.putpalette(options.palette)
+    return image.quantize(palette=palette_image, dither=Image.Dither.NONE)
+
+
+def _classify_page(image: Image.Image) -> str:
+    """用缩小后的采样图统计直方图，判断页面适合的编码：bilevel / gray / palette / jpeg。"""
+    # 最近邻缩小不会混合出新颜色，颜色数与灰度分布都能代表原图
+    sample = image.resize((max(1, image.width // 4), max(1, image.height // 4)), Image.NEAREST)
+    pixels = sample.width * sample.height
+
+    red, green, blue = sample.split()
+    chroma = ImageChops.lighter(ImageChops.difference(red, green), ImageChops.difference(green, blue))
+    colored = sum(chroma.histogram()[24:]) / pixels
+    if colored < 0.005:
+        levels = sample.convert('L').histogram()
+        midtones = sum(levels[48:208]) / pixels
+        return 'bilevel' if midtones < 0.05 else 'gray'
+    if sample.getcolors(256) is not None:
+        return 'palette'
+    return 'jpeg'
+
+
+def _encode_bilevel(image: Image.Image) -> PdfImage:
+    bw = image.convert('L').point(lambda v: 255 if v >= 128 else 0, mode='1')
+    if not features.check('libtiff'):
+        # PIL 的 '1' 模式原始数据按行打包，1 为白色，与 PDF DeviceGray 1 位一致
+        return PdfImage(bw.width, bw.height, zlib.compress(bw.tobytes()), filter='FlateDecode',
+                        color_space='DeviceGray', bits=1)
+
+    # 借助 libtiff 生成 CCITT G4 数据，再按 StripOffsets 取出唯一的条带
+    buf = BytesIO()
+    bw.save(buf, format='TIFF', compression='group4', strip_size=(bw.width + 7) // 8 * bw.height)
+    with Image.open(buf) as tiff:
+        offset = tiff.tag_v2[273][0]
+        length = tiff.tag_v2[279][0]
+    data = buf.getvalue()[offset:offset + length]
+    return PdfImage(bw.width, bw.height, data, filter='CCITTFaxDecode', color_space='DeviceGray', bits=1,
+                    decode_parms={'K': -1, 'Columns': bw.width, 'Rows': bw.height, 'BlackIs1': True})
+
+
+def _encode_jpeg(image: Image.Image, color_space: str) -> PdfImage:
+    buf = BytesIO()
+    image.save(buf, format='JPEG')
+    return PdfImage(image.width, image.height, buf.getvalue(), color_space=color_space)
+
+
+def _encode_palette(image: Image.Image, options: _RasterOptions) -> PdfImage:
+    quantized = _quantize(image, options)
+    # 只保留实际用到的颜色数，写入索引色图片，不再展开回 24 位 RGB
+    colors = quantized.getextrema()[1] + 1
+    palette = bytes(quantized.getpalette()[:colors * 3])
+    return PdfImage(quantized.width, quantized.height, zlib.compress(quantized.tobytes()), filter='FlateDecode',
+                    palette=palette)
+
+
+def _encode_page(image: Image.Image, options: _RasterOptions, kind: str | None = None) -> PdfImage:
+    """kind 非空时跳过内容判断，直接使用指定的编码方式（分条带渲染时各条须保持一致）。"""
+    if options.encoder == 'auto':
+        kind = kind or _classify_page(image)
+        if kind == 'bilevel':
+            return _encode_bilevel(image)
+        if kind == 'gray':
+            return _encode_jpeg(image.convert('L'), 'DeviceGray')
+        if kind == 'palette':
+            return _encode_palette(image, options)
+        return _encode_jpeg(image, 'DeviceRGB')
+
+    pix: Image.Image = _quantize(image, options).convert('RGB')
+    return _encode_jpeg(pix, 'DeviceRGB')
+
+
+# 自适应 DPI：近乎空白的页面使用的分辨率；判断空白时缩略图的 DPI 与深色像素占比上限；
+# 按内嵌图片原始分辨率降低 DPI 时的下限（避免小图片页面被渲染得过于模糊）
+BLANK_PAGE_DPI = 36
+_BLANK_THUMB_DPI = 24
+_BLANK_DARK_RATIO = 0.002
+_ADAPTIVE_MIN_DPI = 72
+
+
+def _has_visible_text(page: fitz.Page) -> bool:
+    # OCR 扫描件常带一层不可见文字（渲染模式 3），不应让它决定页面的 DPI
+    return any(span['type'] != 3 and span['opacity'] > 0 for span in page.get_texttrace())
+
+
+def _adaptive_page_dpi(page: fitz.Page, cap: int) -> int:
+    """含可见文字或矢量图形的页面用 cap；只有图片的页面不超过图片的原始分辨率；近乎空白的页面用最低分辨率。"""
+    if _has_visible_text(page) or page.get_cdrawings():
+        return cap
+
+    thumb = page.get_pixmap(dpi=_BLANK_THUMB_DPI, colorspace=fitz.csGRAY)
+    levels = Image.frombuffer('L', (thumb.width, thumb.height), thumb.samples_mv, 'raw', 'L', thumb.stride, 1).histogram()
+    if sum(levels[:200]) <= thumb.width * thumb.height * _BLANK_DARK_RATIO:
+        return min(cap, BLANK_PAGE_DPI)
+
+    native = max((_placement_dpi(info['width'], info['height'], info['bbox']) for info in page.get_image_info()),
+                 default=0)
+    if native <= 0:
+        return cap
+    return min(cap, max(_ADAPTIVE_MIN_DPI, round(native)))
+
+
+# 单页位图采样数据默认不超过 128 MB，A0 图纸在 300 DPI 以上渲染时会按水平条带分段处理
+MAX_RENDER_BYTES = 128 * 1024 * 1024
+# 分条带渲染时，用于判断编码方式与统计调色板的整页缩略图的像素数上限
+_BAND_OVERVIEW_PIXELS = 4_000_000
+
+
+def _needs_bands(page: fitz.Page, dpi: int, max_render_bytes: int) -> bool:
+    if max_render_bytes <= 0:
+        return False
+    scale = dpi / 72
+    return math.ceil(page.rect.width * scale) * math.ceil(page.rect.height * scale) * 3 > max_render_bytes
+
+
+def _render_bands(page: fitz.Page, dpi: int, options: _RasterOptions) -> list[tuple[PdfImage, float, float, float, float]]:
+    """按水平条带逐段渲染并编码，每段位图不超过 options.max_render_bytes。"""
+    scale = dpi / 72
+    rect = page.rect
+    width_px = math.ceil(rect.width * scale)
+    height_px = math.ceil(rect.height * scale)
+    rows = max(1, options.max_render_bytes // (width_px * 3))
+
+    # 编码方式与调色板由低分辨率的整页缩略图统一决定，避免各条带颜色或编码不一致而出现接缝
+    overview_scale = min(scale, math.sqrt(_BAND_OVERVIEW_PIXELS / (rect.width * rect.height)))
+    overview_pix = page.get_pixmap(matrix=fitz.Matrix(overview_scale, overview_scale))
+    overview = _pixmap_to_image(overview_pix)
+    kind = _classify_page(overview) if options.encoder == 'auto' else None
+    band_options = replace(options)
+    if band_options.palette is None and kind in (None, 'palette'):
+        band_options.palette = overview.quantize(colors=256, method=options.method).getpalette()
+    del overview, overview_pix
+
+    tiles = []
+    matrix = fitz.Matrix(scale, scale)
+    for top in range(0, height_px, rows):
+        bottom = min(top + rows, height_px)
+        clip = fitz.Rect(rect.x0, rect.y0 + top / scale, rect.x1, rect.y0 + bottom / scale)
+        pix = page.get_pixmap(matrix=matrix, clip=clip)
+        encoded = _encode_page(_pixmap_to_image(pix), band_options, kind)
+        # 按实际渲染出的像素高度摆放，条带之间不留缝也不重叠
+        band_height = pix.height / scale
+        tiles.append((encoded, 0, rect.height - top / scale - band_height, rect.width, band_height))
+        del pix
+    return tiles
+
+
+@lru_cache(maxsize=None)
+def _open_render_cache(cache_dir: str, max_bytes: int) -> RenderCache:
+    # 每个进程对同一缓存目录只建一个实例，写入时按累计大小判断是否需要淘汰，不必每页扫描目录
+    return RenderCache(cache_dir, max_bytes)
+
+
+def _projected_raster_bytes(doc: fitz.Document, dpi: int, max_render_bytes: int) -> int:
+    """整份文档按 dpi 渲染时会写入渲染缓存的采样数据总字节数；分条带渲染的超大页面不进缓存，不计入。"""
+    scale = dpi / 72
+    total = 0
+    for page in doc:
+        size = math.ceil(page.rect.width * scale) * math.ceil(page.rect.height * scale) * 3
+        if max_render_bytes <= 0 or size <= max_render_bytes:
+            total += size
+    return total
+
+
+def _samples_digest(width: int, height: int, samples) -> str:
+    digest = hashlib.blake2b(samples, digest_size=16)
+    digest.update(b'%dx%d' % (width, height))
+    return digest.hexdigest()
+
+
+def _rasterize_page(page: fitz.Page, options: _RasterOptions, seen: set[str] | None = None) -> _RasterPage:
+    """seen 为已经（或将按页码顺序先于本页）写出的图片摘要；本页与其中之一相同时不再编码。"""
+    dpi = _adaptive_page_dpi(page, options.dpi) if options.adaptive else options.dpi
+    if _needs_bands(page, dpi, options.max_render_bytes):
+        # 超大页面不整页渲染，也不参与渲染缓存与去重
+        return _RasterPage(None, page.rect.width, page.rect.height, None, dpi=dpi,
+                           tiles=_render_bands(page, dpi, options))
+
+    cache_hit = None
+    cached_bytes = 0
+    cached = None
+    if options.cache_dir is not None:
+        cache = _open_render_cache(options.cache_dir, options.cache_max_bytes)
+        cached = cache.get(options.doc_hash, page.number, dpi)
+        cache_hit = cached is not None
+
+    if cached is not None:
+        width, height, stride, n, samples = cached
+        mode = 'RGBA' if n == 4 else 'RGB'
+        image = Image.frombuffer(mode, (width, height), samples, 'raw', mode, stride, 1)
+        cached_bytes = len(samples)
+    else:
+        img = page.get_pixmap(dpi=dpi)
+        if cache_hit is not None:
+            cache.put(options.doc_hash, page.number, dpi, img)
+        # 直接在 pixmap 的采样缓冲区上构造图像，省去整页 PNG 编码再解码的往返；img 须存活到编码完成
+        image = _pixmap_to_image(img)
+        samples = img.samples_mv
+
+    # 同一任务内编码参数不变，渲染结果逐字节相同的页面编码结果也相同
+    digest = _samples_digest(image.width, image.height, samples)
+    encoded = None
+    if seen is None or digest not in seen:
+        encoded = _encode_page(image, options)
+        if seen is not None:
+            seen.add(digest)
+    return _RasterPage(encoded, page.rect.width, page.rect.height, digest,
+                       cache_hit=cache_hit, cached_bytes=cached_bytes, dpi=dpi)
+
+
+def _rasterize_range(pdf_path: str, start: int, stop: int, options: _RasterOptions,
+                     seen: frozenset[str] = frozenset()) -> list[_RasterPage]:
+    # 运行在子进程中：每个进程自行打开文档，只处理分配到的页码区间；
+    # seen 为提交时已写出的图片摘要，区间内重复的页面也只编码第一次出现的那页
+    local_seen = set(seen)
+    with fitz.open(pdf_path) as doc:
+        return [_rasterize_page(doc[i], options, local_seen) for i in range(start, stop)]
+
+
+def _iter_raster_pages(doc: fitz.Document, pdf_path: str, options: _RasterOptions, workers: int, first: int = 0,
+                       seen: set[str] | None = None):
+    """从第 first 页起按页码顺序产出压缩后的页面；workers > 1 时由进程池并行处理。
+
+    seen 为已写出的图片摘要集合，产出的页面摘要会加入其中；与已有页面相同的页面不再编码（image 为 None）。
+    """
+    seen = set() if seen is None else seen
+    if workers <= 1:
+        for page in doc.pages(first):
+            yield _rasterize_page(page, options, seen)
+        return
+
+    total = len(doc)
+    # 区间不宜过大：既要让各进程负载均衡，也要让按序写出的等待时间尽量短
+    chunk = max(1, min(8, (total - first) // (workers * 4)))
+    ranges = iter([(start, min(start + chunk, total)) for start in range(first, total, chunk)])
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        # 同时在途的区间数有上限，已完成但还没轮到写出的结果不会无限堆积
+        for start, stop in ranges:
+            pending.append(pool.submit(_rasterize_range, pdf_path, start, stop, options, frozenset(seen)))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            seen.update(page.digest for page in pages if page.digest)
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(_rasterize_range, pdf_path, *next_range, options, frozenset(seen)))
+            yield from pages
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _sample_page_indexes(total: int, count: int) -> list[int]:
+    """在全文档范围内均匀挑选 count 个页码（含首尾页）。"""
+    if count >= total:
+        return list(range(total))
+    if count <= 1:
+        return [0]
+    return sorted({round(i * (total - 1) / (count - 1)) for i in range(count)})
+
+
+def build_shared_palette(doc: fitz.Document, sample_pages: int, method: int = 0) -> list[int]:
+    """从均匀抽样的若干页中统计颜色，生成全文档共用的 256 色调色板。"""
+    # 调色板只关心颜色分布，抽样页用低分辨率渲染即可
+    samples = []
+    for index in _sample_page_indexes(len(doc), sample_pages):
+        pix = doc[index].get_pixmap(dpi=36)
+        samples.append(_pixmap_to_image(pix).copy())
+
+    montage = Image.new('RGB', (max(im.width for im in samples), sum(im.height for im in samples)), 'white')
+    top = 0
+    for im in samples:
+        montage.paste(im, (0, top))
+        top += im.height
+    return montage.quantize(colors=256, method=method).getpalette()
+
+
+def _source_fingerprint(path: Path) -> dict:
+    stat = path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _load_checkpoint(checkpoint_path: Path, part_path: Path, expected: dict) -> dict | None:
+    """读取断点；源文件或压缩参数有变化、或临时文件缺失时返回 None，从头开始。"""
+    if not checkpoint_path.exists() or not part_path.exists():
+        return None
+    try:
+        checkpoint = json.loads(checkpoint_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('job') != expected:
+        return None
+    if part_path.stat().st_size < checkpoint['writer']['length']:
+        return None
+    return checkpoint
+
+
+# 断点最多每隔这么多秒保存一次：每次保存都要序列化全部对象偏移，逐页保存在大文档上是平方级开销；
+# 暂停与取消时另外立即保存，中途崩溃最多损失这段时间内的页面
+CHECKPOINT_INTERVAL = 2.0
+
+
+def _save_checkpoint(checkpoint_path: Path, job: dict, pages_done: int, writer: StreamingPdfWriter):
+    tmp_path = checkpoint_path.with_name(checkpoint_path.name + '.tmp')
+    tmp_path.write_text(json.dumps({'job': job, 'pages_done': pages_done, 'writer': writer.state()}), encoding='utf-8')
+    os.replace(tmp_path, checkpoint_path)
+
+
+def compress_pdf(pdf_path: str, out_dir: str, dpi: int, img_type: str = "png", method: int = 0, progress_cb=None,
+                 workers: int = 1, palette_pages: int = 0, encoder: str = 'rgb', control: JobControl | None = None,
+                 render_cache: RenderCache | None = None, stats: dict | None = None, adaptive_dpi: bool = False,
+                 max_render_bytes: int = MAX_RENDER_BYTES) -> str:
+    """render_cache 非空时复用之前各次压缩（任意量化方法、编码方式）已渲染的页面；
+    整份文档的渲染结果超过缓存容量时不使用缓存，以免顺序扫描下反复写入却从不命中；
+    stats 非空时写入本次的缓存命中页数、未命中页数、命中率与省去渲染的字节数等统计；
+    adaptive_dpi 为 True 时逐页按内容选择 DPI（只含低分辨率扫描图的页面按原始分辨率、空白页用最低分辨率），dpi 为上限；
+    单页位图超过 max_render_bytes 字节时分条带渲染，以此限制每页的内存占用。"""
+    source_path = Path(pdf_path)
+    target_dir = Path(out_dir) if out_dir else source_path.parent
+
+    out_name = f"{source_path.stem}_in_{dpi}dpi.pdf"
+    out_path = target_dir / out_name
+    # 逐页写入临时文件，全部成功后再替换为正式文件，避免留下半截 PDF；
+    # 定期及暂停、取消时记录断点，取消或中断后以相同参数重新压缩时从断点继续
+    part_path = out_path.with_name(out_name + '.part')
+    checkpoint_path = out_path.with_name(out_name + '.part.json')
+
+    job = {
+        'source': _source_fingerprint(source_path),
+        'dpi': dpi,
+        'method': method,
+        'palette_pages': palette_pages,
+        'encoder': encoder,
+        'adaptive_dpi': adaptive_dpi,
+    }
+    checkpoint = _load_checkpoint(checkpoint_path, part_path, job)
+    if checkpoint is None:
+        checkpoint_path.unlink(missing_ok=True)
+    pages_done = checkpoint['pages_done'] if checkpoint else 0
+
+    try:
+        with fitz.open(str(source_path)) as doc, open(part_path, 'r+b' if checkpoint else 'wb') as fp:
+            total = len(doc)
+            if total == 0:
+                raise ValueError("PDF为空，无法压缩")
+
+            options = _RasterOptions(dpi=dpi, method=method, encoder=encoder, adaptive=adaptive_dpi,
+                                     max_render_bytes=max_render_bytes)
+            # 整份文档放不进缓存时不启用：按页顺序扫描下 LRU 总是先淘汰本文档靠前的页面，
+            # 下次压缩一页也命中不了，只白白写入大量数据；自适应 DPI 只会更小，按上限估算
+            use_cache = (render_cache is not None
+                         and _projected_raster_bytes(doc, dpi, max_render_bytes) <= render_cache.max_bytes)
+            if use_cache:
+                options.cache_dir = str(render_cache.cache_dir)
+                options.cache_max_bytes = render_cache.max_bytes
+                options.doc_hash = document_hash(str(source_path))
+            # palette_pages > 0 时先抽样建立共享调色板，之后每页只做最近颜色映射
+            if palette_pages > 0:
+                options.palette = build_shared_palette(doc, palette_pages, method)
+
+            writer = StreamingPdfWriter(fp, checkpoint['writer'] if checkpoint else None)
+            if progress_cb is not None and pages_done:
+                progress_cb((pages_done / total) * 100)
+
+            hits = misses = saved = duplicates = adapted = 0
+            last_saved = time.monotonic()
+            pages = _iter_raster_pages(doc, str(source_path), options, workers, first=pages_done,
+                                       seen=writer.image_digests)
+            with closing(pages):
+                for i, raster in enumerate(pages, start=pages_done):
+                    if raster.cache_hit:
+                        hits += 1
+                        saved += raster.cached_bytes
+                    elif raster.cache_hit is not None:
+                        misses += 1
+                    if control is not None:
+                        if control.is_paused or control.is_cancelled:
+                            # 此时前 i 页已完整写入，写入器状态一致，先保存断点再暂停或退出
+                            _save_checkpoint(checkpoint_path, job, i, writer)
+                            last_saved = time.monotonic()
+                        control.checkpoint()
+                    if writer.has_image(raster.digest):
+                        duplicates += 1
+                    if raster.dpi < dpi:
+                        adapted += 1
+                    if raster.tiles is not None:
+                        writer.add_tiled_page(raster.tiles, raster.width_pt, raster.height_pt)
+                    else:
+                        writer.add_page(raster.image, raster.width_pt, raster.height_pt, raster.digest)
+                    if time.monotonic() - last_saved >= CHECKPOINT_INTERVAL:
+                        _save_checkpoint(checkpoint_path, job, i + 1, writer)
+                        last_saved = time.monotonic()
+
+                    if progress_cb is not None:
+                        progress_cb(((i + 1) / total) * 100)
+
+            if writer.page_count == 0:
+                raise ValueError("无法读取PDF首页")
+            writer.close()
+    except BaseException:
+        # 已有页面写入断点时保留临时文件，供下次继续；否则清理掉
+        if not checkpoint_path.exists():
+            part_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(part_path, out_path)
+    checkpoint_path.unlink(missing_ok=True)
+    if use_cache and workers > 1:
+        # 各子进程只累计自己的写入量，合计可能超出上限，结束时统一收回
+        render_cache.evict()
+    if stats is not None:
+        stats.update({
+            'cache_hits': hits,
+            'cache_misses': misses,
+            'cache_hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'cache_bytes_saved': saved,
+            'duplicate_pages': duplicates,
+            'adaptive_pages': adapted,
+        })
+    return str(out_path)
+
+
+@dataclass
+class PdfOptimizeResult:
+    """无损优化的结果：输出路径与优化前后的字节数。"""
+
+    out_path: str
+    original_bytes: int
+    optimized_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.optimized_bytes
+
+    @property
+    def ratio(self) -> float:
+        return self.optimized_bytes / self.original_bytes if self.original_bytes else 1.0
+
+
+def optimize_pdf(pdf_path: str, out_dir: str, progress_cb=None) -> PdfOptimizeResult:
+    """无损优化：清理无用对象、合并重复对象、压缩未压缩的流并打包对象流，不做任何栅格化。"""
+    source_path = Path(pdf_path)
+    target_dir = Path(out_dir) if out_dir else source_path.parent
+    out_path = target_dir / f"{source_path.stem}_optimized.pdf"
+    part_path = out_path.with_name(out_path.name + '.part')
+
+    if progress_cb is not None:
+        progress_cb(0)
+    try:
+        with fitz.open(str(source_path)) as doc:
+            if len(doc) == 0:
+                raise ValueError("PDF为空，无法优化")
+            # garbage=4：删除未引用对象并合并内容相同的对象（重复的字体、图片等）；
+            # deflate*：对未压缩的流做无损 Flate 压缩；use_objstms：把零散对象打包进压缩的对象流
+            doc.save(str(part_path), garbage=4, deflate=True, deflate_images=True, deflate_fonts=True, use_objstms=1)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, out_path)
+    if progress_cb is not None:
+        progress_cb(100)
+    return PdfOptimizeResult(str(out_path), source_path.stat().st_size, out_path.stat().st_size)
+
+
+def _placement_dpi(width_px: int, height_px: int, bbox) -> float:
+    """图片按 bbox（单位：点）显示时的实际分辨率，取横纵两个方向中较小的一个。"""
+    rect = fitz.Rect(bbox)
+    if rect.is_empty:
+        return 0.0
+    return min(width_px * 72 / rect.width, height_px * 72 / rect.height)
+
+
+def _recompressible(doc: fitz.Document, xref: int) -> bool:
+    # 带透明蒙版、本身就是蒙版或 1 位黑白的图片转成 JPEG 只会失真或变大，保持原样
+    if doc.xref_get_key(xref, 'SMask')[0] != 'null':
+        return False
+    if doc.xref_get_key(xref, 'ImageMask')[1] == 'true':
+        return False
+    return doc.xref_get_key(xref, 'BitsPerComponent')[1] != '1'
+
+
+def _downsample_image(doc: fitz.Document, xref: int, scale: float, quality: int) -> bytes:
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    # CMYK、Lab、索引色等先转换为 RGB；灰度与 RGB 直接使用
+    if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    image = _pixmap_to_image(pix)
+    size = (max(1, round(pix.width * scale)), max(1, round(pix.height * scale)))
+    resized = image.resize(size, Image.LANCZOS)
+    # image 直接引用 pix 的采样内存，须先于 pix 释放
+    del image
+
+    buf = BytesIO()
+    resized.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def recompress_pdf_images(pdf_path: str, out_dir: str, dpi: int, quality: int = 75, progress_cb=None,
+                          control: JobControl | None = None) -> str:
+    """只把分辨率高于 dpi 的内嵌图片降采样并重新编码，文字与矢量内容保持原样。"""
     source_path = Path(pdf_path)
     target_dir = Path(out_dir) if out_dir else source_path.parent
 
-    merges = []
-    first_file = None
+    out_name = f"{source_path.stem}_img_{dpi}dpi.pdf"
+    out_path = target_dir / out_name
+    part_path = out_path.with_name(out_name + '.part')
+
+    try:
+        with fitz.open(str(source_path)) as doc:
+            total = len(doc)
+            if total == 0:
+                raise ValueError("PDF为空，无法压缩")
+
+            # 同一图片可能在多处以不同尺寸显示，按最低的显示分辨率（即最大的显示尺寸）决定保留多少像素
+            lowest_dpi: dict[int, float] = {}
+            # 每张图片只在第一次出现的页面上替换一次
+            page_xrefs: list[list[int]] = [[] for _ in range(total)]
+            for pno, page in enumerate(doc.pages()):
+                for info in page.get_image_info(xrefs=True):
+                    xref = info['xref']
+                    placed = _placement_dpi(info['width'], info['height'], info['bbox'])
+                    if xref <= 0 or placed <= 0:
+                        continue
+                    if xref not in lowest_dpi:
+                        page_xrefs[pno].append(xref)
+                    lowest_dpi[xref] = min(placed, lowest_dpi.get(xref, placed))
+
+            for pno, page in enumerate(doc.pages()):
+                if control is not None:
+                    control.checkpoint()
+                for xref in page_xrefs[pno]:
+                    # 留一点余量，略高于目标分辨率的图片重新编码得不偿失
+                    if lowest_dpi[xref] <= dpi * 1.1 or not _recompressible(doc, xref):
+                        continue
+                    try:
+                        stream = _downsample_image(doc, xref, dpi / lowest_dpi[xref], quality)
+                    except Exception:
+                        # 个别无法解码或转换的图片保留原数据流，不影响其余图片
+                        continue
+                    if len(stream) < len(doc.xref_stream_raw(xref)):
+                        page.replace_image(xref, stream=stream)
+
+                if progress_cb is not None:
+                    progress_cb(((pno + 1) / total) * 100)
+
+            doc.save(str(part_path), garbage=3, deflate=True)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(part_path, out_path)
+    return str(out_path)
+
+
+# 可以原样写成独立图片文件的 PDF 滤镜及对应扩展名；其他滤镜交给 PyMuPDF 解码后转存
+_RAW_IMAGE_FILTERS = {'/DCTDecode': 'jpg', '/JPXDecode': 'jp2'}
+
+
+@dataclass
+class PdfExtractResult:
+    """图片提取的结果：输出目录、提取的图片数、写出的总字节数与耗时（秒）。"""
+
+    out_dir: str
+    count: int
+    total_bytes: int
+    seconds: float
+
+    @property
+    def images_per_sec(self) -> float:
+        return self.count / self.seconds if self.seconds > 0 else 0.0
+
+
+def _extract_image(doc: fitz.Document, xref: int) -> tuple[bytes, str] | None:
+    kind, value = doc.xref_get_key(xref, 'Filter')
+    ext = _RAW_IMAGE_FILTERS.get(value) if kind == 'name' else None
+    if ext is not None:
+        # JPEG / JPEG 2000 数据流本身就是完整的图片文件，直接写出，不解码也不重新编码
+        return doc.xref_stream_raw(xref), ext
+    extracted = doc.extract_image(xref)
+    if not extracted or not extracted.get('image'):
+        return None
+    return extracted['image'], extracted['ext']
+
+
+def _extract_xrefs(pdf_path: str, items: list[tuple[int, int]], out_dir: str, stem: str) -> tuple[int, int]:
+    # 运行在子进程中：items 为 (首次出现的页码, xref)，返回 (写出的图片数, 字节数)
+    count = total_bytes = 0
+    with fitz.open(pdf_path) as doc:
+        for pno, xref in items:
+            extracted = _extract_image(doc, xref)
+            if extracted is None:
+                continue
+            data, ext = extracted
+            (Path(out_dir) / f"{stem}_p{pno + 1:04d}_x{xref}.{ext}").write_bytes(data)
+            count += 1
+            total_bytes += len(data)
+    return count, total_bytes
+
+
+def extract_pdf_images(pdf_path: str, out_dir: str, progress_cb=None, workers: int = 1,
+                       control: JobControl | None = None) -> PdfExtractResult:
+    """按存储格式原样导出 PDF 内嵌的图片（JPEG / JPEG 2000 不重新编码），同一图片只导出一次。"""
+    start = time.perf_counter()
+    source_path = Path(pdf_path)
+    target_dir = (Path(out_dir) if out_dir else source_path.parent) / f"{source_path.stem}_images"
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    with fitz.open(str(source_path)) as doc:
+        if len(doc) == 0:
+            raise ValueError("PDF为空，无法提取图片")
+        # 只读取各页的图片列表，不解码；同一 xref 只保留第一次出现的页码
+        first_page: dict[int, int] = {}
+        for pno in range(len(doc)):
+            for item in doc.get_page_images(pno):
+                first_page.setdefault(item[0], pno)
+    items = [(pno, xref) for xref, pno in first_page.items()]
+    if not items:
+        raise ValueError("PDF中没有内嵌图片")
+
+    # 按页码顺序切块，块不宜过大，以便进度与暂停/取消及时响应
+    chunk = max(1, min(32, len(items) // (max(workers, 1) * 4)))
+    chunks = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+    count = total_bytes = done = 0
+
+    def collect(result: tuple[int, int], size: int):
+        nonlocal count, total_bytes, done
+        count += result[0]
+        total_bytes += result[1]
+        done += size
+        if progress_cb is not None:
+            progress_cb(done / len(items) * 100)
+
+    if workers <= 1:
+        for part in chunks:
+            if control is not None:
+                control.checkpoint()
+            collect(_extract_xrefs(str(source_path), part, str(target_dir), source_path.stem), len(part))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(pool.submit(_extract_xrefs, str(source_path), part, str(target_dir), source_path.stem), len(part))
+                       for part in chunks]
+            try:
+                for future, size in futures:
+                    if control is not None:
+                        control.checkpoint()
+                    collect(future.result(), size)
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    return PdfExtractResult(str(target_dir), count, total_bytes, time.perf_counter() - start)
+
+
+# 页面导出支持的图片格式（扩展名 -> Pillow 格式名）
+EXPORT_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG'}
+
+
+def _export_range(pdf_path: str, start: int, stop: int, dpi: int, out_dir: str, stem: str, img_format: str,
+                  quality: int) -> int:
+    # 运行在子进程中：渲染 [start, stop) 页并逐页写出图片文件，返回写出的页数
+    save_kwargs = {'compress_level': 1} if EXPORT_FORMATS[img_format] == 'PNG' else {'quality': quality}
+    with fitz.open(pdf_path) as doc:
+        for pno in range(start, stop):
+            pix = doc[pno].get_pixmap(dpi=dpi)
+            path = Path(out_dir) / f"{stem}_p{pno + 1:04d}.{img_format}"
+            # 先写临时文件再改名，下游程序监视目录时不会读到写了一半的图片
+            part_path = path.with_name(path.name + '.part')
+            _pixmap_to_image(pix).save(str(part_path), format=EXPORT_FORMATS[img_format], **save_kwargs)
+            os.replace(part_path, path)
+    return stop - start
+
+
+def export_pdf_pages(pdf_path: str, out_dir: str, dpi: int, img_format: str = 'png', quality: int = 90,
+                     progress_cb=None, workers: int = 1, first_page: int = 1, last_page: int | None = None,
+                     control: JobControl | None = None) -> str:
+    """把第 first_page 到 last_page 页（从 1 开始，含两端）渲染成图片文件，返回输出目录；
+    页面按区间分给多个进程并行渲染，每页完成后立即写入输出目录。"""
+    img_format = img_format.lower()
+    if img_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的图片格式：{img_format}")
+    source_path = Path(pdf_path)
+    target_dir = (Path(out_dir) if out_dir else source_path.parent) / f"{source_path.stem}_pages_{dpi}dpi"
+
     with fitz.open(str(source_path)) as doc:
         total = len(doc)
-        if total == 0:
+    if total == 0:
+        raise ValueError("PDF为空，无法导出")
+    start = max(1, first_page) - 1
+    stop = min(total, last_page or total)
+    if start >= stop:
+        raise ValueError(f"页码范围无效：共 {total} 页")
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    count = stop - start
+    chunk = max(1, min(8, count // (max(workers, 1) * 4)))
+    ranges = [(i, min(i + chunk, stop)) for i in range(start, stop, chunk)]
+    args = (dpi, str(target_dir), source_path.stem, img_format, quality)
+    done = 0
+
+    def report(pages: int):
+        nonlocal done
+        done += pages
+        if progress_cb is not None:
+            progress_cb(done / count * 100)
+
+    if workers <= 1:
+        for range_start, range_stop in ranges:
+            if control is not None:
+                control.checkpoint()
+            report(_export_range(str(source_path), range_start, range_stop, *args))
+        return str(target_dir)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_export_range, str(source_path), range_start, range_stop, *args)
+                   for range_start, range_stop in ranges]
+        try:
+            # 各页面文件相互独立，哪个区间先完成就先计入进度，不必按页码顺序等待
+            for future in as_completed(futures):
+                if control is not None:
+                    control.checkpoint()
+                report(future.result())
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+    return str(target_dir)
+
+
+# 目标大小模式下依次尝试的 DPI（从高到低）与量化方法；MAXCOVERAGE 估算耗时过长，且对输出大小影响很小，不参与
+TARGET_SIZE_DPIS = (600, 450, 400, 300, 250, 200, 150, 120, 100, 72)
+TARGET_SIZE_METHODS = (0, 2)
+# 每页除图片数据外的对象开销（页面、内容流、交叉引用），以及文件头尾的固定开销，单位：字节
+_PAGE_OVERHEAD = 400
+_FILE_OVERHEAD = 1024
+
+
+def _estimate_sizes(doc: fitz.Document, dpi: int, methods, sample_indexes: list[int], palette_pages: int = 0,
+                    encoder: str = 'rgb', max_render_bytes: int = MAX_RENDER_BYTES,
+                    adaptive: bool = False) -> dict[int, int]:
+    """压缩抽样页并按页数外推整份文档的输出大小；同一页只渲染一次，各量化方法共用。
+
+    adaptive 为 True 时与正式压缩一样逐页按内容选择 DPI，dpi 作为上限。
+    """
+    palettes = {method: build_shared_palette(doc, palette_pages, method) if palette_pages > 0 else None for method in methods}
+    sizes = dict.fromkeys(methods, 0)
+    for index in sample_indexes:
+        page = doc[index]
+        page_dpi = _adaptive_page_dpi(page, dpi) if adaptive else dpi
+        if _needs_bands(page, page_dpi, max_render_bytes):
+            # 超大页面与正式压缩一样分条带处理，估算时也不会一次分配整页位图
+            for method in methods:
+                options = _RasterOptions(dpi=page_dpi, method=method, palette=palettes[method], encoder=encoder,
+                                         max_render_bytes=max_render_bytes)
+                tiles = _render_bands(page, page_dpi, options)
+                sizes[method] += sum(len(tile[0].data) for tile in tiles) + _PAGE_OVERHEAD
+            continue
+        pix = page.get_pixmap(dpi=page_dpi)
+        image = _pixmap_to_image(pix)
+        for method in methods:
+            options = _RasterOptions(dpi=page_dpi, method=method, palette=palettes[method], encoder=encoder)
+            sizes[method] += len(_encode_page(image, options).data) + _PAGE_OVERHEAD
+
+    scale = len(doc) / len(sample_indexes)
+    return {method: round(size * scale) + _FILE_OVERHEAD for method, size in sizes.items()}
+
+
+def estimate_compressed_size(pdf_path: str, dpi: int, method: int = 0, sample_pages: int = 4, palette_pages: int = 0,
+                             encoder: str = 'rgb', max_render_bytes: int = MAX_RENDER_BYTES,
+                             adaptive_dpi: bool = False) -> int:
+    """不做完整压缩，只压缩少量抽样页来估算输出文件的字节数。"""
+    with fitz.open(pdf_path) as doc:
+        if len(doc) == 0:
+            raise ValueError("PDF为空，无法压缩")
+        indexes = _sample_page_indexes(len(doc), sample_pages)
+        return _estimate_sizes(doc, dpi, (method,), indexes, palette_pages, encoder, max_render_bytes,
+                               adaptive_dpi)[method]
+
+
+def choose_settings_for_size(pdf_path: str, target_bytes: int, method: int = 0, max_dpi: int = 600, sample_pages: int = 4,
+                             palette_pages: int = 0, encoder: str = 'rgb', progress_cb=None,
+                             max_render_bytes: int = MAX_RENDER_BYTES,
+                             adaptive_dpi: bool = False) -> tuple[int, int, int]:
+    """找出预计输出不超过 target_bytes 的最高 DPI 及对应量化方法，返回 (dpi, method, 预计字节数)；
+    抽样页超过 max_render_bytes 时与正式压缩一样分条带渲染，adaptive_dpi 时同样逐页自适应 DPI，DPI 为上限。"""
+    candidates = [dpi for dpi in TARGET_SIZE_DPIS if dpi <= max_dpi] or [min(TARGET_SIZE_DPIS)]
+    with fitz.open(pdf_path) as doc:
+        if len(doc) == 0:
             raise ValueError("PDF为空，无法压缩")
+        indexes = _sample_page_indexes(len(doc), sample_pages)
 
-        for i, page in enumerate(doc.pages(), start=0):
-            img = page.get_pixmap(dpi=dpi)
-            img_bytes = img.pil_tobytes(format=img_type)
-            image = Image.open(BytesIO(img_bytes))
-            if i == 0:
-                first_file = image
-            pix: Image.Image = image.quantize(colors=256, method=method).convert('RGB')
-            merges.append(pix)
+        probes = len(candidates).bit_length() + 1
+        probe = 0
 
+        def report():
+            nonlocal probe
+            probe += 1
             if progress_cb is not None:
-                progress_cb(((i + 1) / total) * 100)
+                progress_cb(min(probe / probes, 1) * 100)
 
-    if first_file is None:
-        raise ValueError("无法读取PDF首页")
+        # 输出大小随 DPI 单调变化：先用首选量化方法二分查找满足预算的最高 DPI，只需估算 log2(候选数) 次
+        best = None
+        smallest = None
+        low, high = 0, len(candidates) - 1
+        while low <= high:
+            mid = (low + high) // 2
+            size = _estimate_sizes(doc, candidates[mid], (method,), indexes, palette_pages, encoder,
+                                   max_render_bytes, adaptive_dpi)[method]
+            if size <= target_bytes:
+                best = (candidates[mid], method, size)
+                high = mid - 1
+            else:
+                smallest = size if smallest is None else min(smallest, size)
+                low = mid + 1
+            report()
 
-    out_name = f"{source_path.stem}_in_{dpi}dpi.pdf"
-    out_path = target_dir / out_name
+        # 再看高一档的 DPI（都放不下时为最低档）换用其他量化方法能否放进预算
+        upper = candidates.index(best[0]) - 1 if best else len(candidates) - 1
+        if upper >= 0:
+            for other in TARGET_SIZE_METHODS:
+                if other == method:
+                    continue
+                size = _estimate_sizes(doc, candidates[upper], (other,), indexes, palette_pages, encoder,
+                                       max_render_bytes, adaptive_dpi)[other]
+                if size <= target_bytes:
+                    best = (candidates[upper], other, size)
+                    break
+                smallest = min(smallest, size) if smallest is not None else size
+            report()
 
-    first_file.save(
-        str(out_path),
-        "pdf",
-        save_all=True,
-        append_images=merges[1:],
+    if best is None:
+        raise ValueError(
+            f"目标大小过小：即使使用 {candidates[-1]} DPI，预计仍需 {smallest / 1024 / 1024:.1f} MB"
+        )
+    return best
+
+
+def compress_pdf_to_size(pdf_path: str, out_dir: str, target_bytes: int, method: int = 0, max_dpi: int = 600,
+                         progress_cb=None, workers: int = 1, palette_pages: int = 0, encoder: str = 'rgb',
+                         control: JobControl | None = None, render_cache: RenderCache | None = None,
+                         stats: dict | None = None, adaptive_dpi: bool = False,
+                         max_render_bytes: int = MAX_RENDER_BYTES) -> str:
+    """先用抽样页估算选出合适的 DPI 与量化方法，再只做一次完整压缩。"""
+    # 估算阶段占进度条前 10%，完整压缩占剩余部分；估算阶段同样响应暂停与取消
+    def estimate_cb(value):
+        if control is not None:
+            control.checkpoint()
+        if progress_cb is not None:
+            progress_cb(value * 0.1)
+
+    compress_cb = None if progress_cb is None else (lambda value: progress_cb(10 + value * 0.9))
+
+    dpi, method, _ = choose_settings_for_size(
+        pdf_path, target_bytes, method=method, max_dpi=max_dpi, palette_pages=palette_pages, encoder=encoder,
+        progress_cb=estimate_cb, max_render_bytes=max_render_bytes, adaptive_dpi=adaptive_dpi,
     )
-    return str(out_path)
+    return compress_pdf(
+        pdf_path, out_dir, dpi, method=method, progress_cb=compress_cb, workers=workers, palette_pages=palette_pages,
+        encoder=encoder, control=control, render_cache=render_cache, stats=stats, adaptive_dpi=adaptive_dpi,
+        max_render_bytes=max_render_bytes,
+    )
+
+
+# 预览图长边的最大像素数：超过时降低渲染 DPI，保证拖动滑块时仍能快速出图
+PREVIEW_MAX_SIDE = 1000
+
+
+def _decode_for_preview(encoded: PdfImage, image: Image.Image) -> Image.Image:
+    """把编码结果还原成可显示的 RGB 图像，体现 JPEG / 调色板 / 黑白化带来的画质损失。"""
+    if encoded.filter == 'DCTDecode':
+        return Image.open(BytesIO(encoded.data)).convert('RGB')
+    if encoded.palette is not None:
+        indexed = Image.frombytes('P', (encoded.width, encoded.height), zlib.decompress(encoded.data))
+        indexed.putpalette(encoded.palette)
+        return indexed.convert('RGB')
+    # 黑白页：G4 与 Flate 都是无损的，直接按相同阈值二值化即可
+    return image.convert('L').point(lambda v: 255 if v >= 128 else 0).convert('RGB')
+
+
+def get_page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def render_preview(pdf_path: str, page_index: int, dpi: int, method: int = 0, encoder: str = 'rgb',
+                   max_side: int = PREVIEW_MAX_SIDE, palette_pages: int = 0,
+                   adaptive_dpi: bool = False) -> tuple[Image.Image, int]:
+    """按压缩参数渲染单页预览，返回 (RGB 预览图, 该页按预览分辨率编码后的字节数)。
+
+    共享调色板与自适应 DPI 的处理与 compress_pdf 相同，预览即为实际写出的效果。
+    """
+    with fitz.open(pdf_path) as doc:
+        if not 0 <= page_index < len(doc):
+            raise ValueError(f"页码超出范围：共 {len(doc)} 页")
+        page = doc[page_index]
+        page_dpi = _adaptive_page_dpi(page, dpi) if adaptive_dpi else dpi
+        palette = build_shared_palette(doc, palette_pages, method) if palette_pages > 0 else None
+        # 长边不超过 max_side：低于所选 DPI 时按比例缩小渲染，画质损失的观感基本一致
+        preview_dpi = min(page_dpi, max_side * 72 / max(page.rect.width, page.rect.height))
+        pix = page.get_pixmap(dpi=max(1, round(preview_dpi)))
+        image = _pixmap_to_image(pix)
+        encoded = _encode_page(image, _RasterOptions(dpi=page_dpi, method=method, palette=palette, encoder=encoder))
+        return _decode_for_preview(encoded, image), len(encoded.data)
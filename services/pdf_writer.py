@@ -0,0 +1,184 @@
+"""流式 PDF 写入器：逐页把图片写入文件，内存占用与页数无关。"""
+from dataclasses import dataclass
+from typing import BinaryIO
+
+
+@dataclass
+class PdfImage:
+    """一张已编码、可直接写入 PDF 的图片。"""
+
+    width: int
+    height: int
+    data: bytes
+    filter: str = 'DCTDecode'
+    color_space: str = 'DeviceRGB'
+    bits: int = 8
+    # 非空时图片为索引色：data 中每个字节是调色板下标，palette 为扁平的 RGB 字节
+    palette: bytes | None = None
+    decode_parms: dict[str, int | bool] | None = None
+
+
+def _pdf_name(name: str) -> bytes:
+    return b'/' + name.encode('ascii')
+
+
+def _pdf_value(value) -> bytes:
+    if isinstance(value, bool):
+        return b'true' if value else b'false'
+    return str(value).encode('ascii')
+
+
+def _color_space(image: PdfImage) -> bytes:
+    if image.palette is None:
+        return _pdf_name(image.color_space)
+    return b'[/Indexed %s %d <%s>]' % (
+        _pdf_name(image.color_space), len(image.palette) // 3 - 1, image.palette.hex().encode('ascii'),
+    )
+
+
+class StreamingPdfWriter:
+    """每调用一次 add_page 就把该页的对象写入文件，最后由 close 补写页面树与交叉引用表。
+
+    add_page 传入 digest 时按摘要去重：内容相同的图片只写一次，后续页面直接引用同一个图片对象；
+    页面尺寸相同的内容流同样共用一份。
+    """
+
+    _CATALOG_ID = 1
+    _PAGES_ID = 2
+
+    def __init__(self, fp: BinaryIO, state: dict | None = None):
+        """state 为之前 state() 保存的进度时，截断 fp 中其后的内容并从该处继续写入。"""
+        self._fp = fp
+        if state is None:
+            self._offsets: dict[int, int] = {}
+            self._page_ids: list[int] = []
+            self._next_id = 3
+            self._image_ids: dict[str, int] = {}
+            self._contents_ids: dict[str, int] = {}
+            self._fp.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+            return
+
+        self._offsets = {int(obj_id): offset for obj_id, offset in state['offsets']}
+        self._page_ids = list(state['page_ids'])
+        self._next_id = state['next_id']
+        self._image_ids = dict(state.get('image_ids', {}))
+        self._contents_ids = dict(state.get('contents_ids', {}))
+        self._fp.seek(state['length'])
+        self._fp.truncate()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    @property
+    def image_digests(self) -> set[str]:
+        return set(self._image_ids)
+
+    def has_image(self, digest: str) -> bool:
+        return digest in self._image_ids
+
+    def state(self) -> dict:
+        """返回可 JSON 序列化的写入进度；调用前已写入的页面会先落盘。"""
+        self._fp.flush()
+        return {
+            'length': self._fp.tell(),
+            'next_id': self._next_id,
+            'page_ids': list(self._page_ids),
+            'offsets': [[obj_id, offset] for obj_id, offset in self._offsets.items()],
+            'image_ids': dict(self._image_ids),
+            'contents_ids': dict(self._contents_ids),
+        }
+
+    def _alloc(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_obj(self, obj_id: int, body: bytes, stream: bytes | None = None):
+        self._offsets[obj_id] = self._fp.tell()
+        self._fp.write(b'%d 0 obj\n' % obj_id)
+        if stream is None:
+            self._fp.write(body)
+        else:
+            self._fp.write(body[:-2] + b' /Length %d >>\nstream\n' % len(stream))
+            self._fp.write(stream)
+            self._fp.write(b'\nendstream')
+        self._fp.write(b'\nendobj\n')
+
+    def _write_image(self, image: PdfImage) -> int:
+        image_id = self._alloc()
+        parms = b''
+        if image.decode_parms:
+            parms = b' /DecodeParms << %s >>' % b' '.join(
+                _pdf_name(key) + b' ' + _pdf_value(value) for key, value in image.decode_parms.items()
+            )
+        body = (
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /BitsPerComponent %d'
+            b' /ColorSpace %s /Filter %s%s >>'
+            % (image.width, image.height, image.bits, _color_space(image), _pdf_name(image.filter), parms)
+        )
+        self._write_obj(image_id, body, image.data)
+        return image_id
+
+    def _image_id(self, image: PdfImage | None, digest: str | None) -> int:
+        if digest is not None and digest in self._image_ids:
+            return self._image_ids[digest]
+        if image is None:
+            raise ValueError(f'图片摘要 {digest} 尚未写入，缺少图片数据')
+        image_id = self._write_image(image)
+        if digest is not None:
+            self._image_ids[digest] = image_id
+        return image_id
+
+    def _write_page(self, placements: list[tuple[int, float, float, float, float]], width_pt: float, height_pt: float):
+        """placements 中每项为 (图片对象号, x, y, 宽, 高)，单位为点，原点在页面左下角。"""
+        contents = b''.join(
+            b'q %.4f 0 0 %.4f %.4f %.4f cm /Im%d Do Q\n' % (w, h, x, y, i)
+            for i, (_, x, y, w, h) in enumerate(placements)
+        )
+        contents_key = contents.decode('ascii')
+        contents_id = self._contents_ids.get(contents_key)
+        if contents_id is None:
+            contents_id = self._alloc()
+            self._write_obj(contents_id, b'<< >>', contents)
+            self._contents_ids[contents_key] = contents_id
+
+        xobjects = b' '.join(b'/Im%d %d 0 R' % (i, image_id) for i, (image_id, *_) in enumerate(placements))
+        page_id = self._alloc()
+        self._write_obj(
+            page_id,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f]'
+            b' /Resources << /XObject << %s >> >> /Contents %d 0 R >>'
+            % (self._PAGES_ID, width_pt, height_pt, xobjects, contents_id),
+        )
+        self._page_ids.append(page_id)
+
+    def add_page(self, image: PdfImage | None, width_pt: float, height_pt: float, digest: str | None = None):
+        """写入一页：图片铺满 width_pt x height_pt（单位：点）的页面。
+
+        digest 已写入过时复用该图片对象，此时 image 可以为 None（调用方省去了重复编码）。
+        """
+        image_id = self._image_id(image, digest)
+        self._write_page([(image_id, 0, 0, width_pt, height_pt)], width_pt, height_pt)
+
+    def add_tiled_page(self, tiles: list[tuple[PdfImage, float, float, float, float]], width_pt: float,
+                       height_pt: float):
+        """写入由多块图片拼成的一页：tiles 中每项为 (图片, x, y, 宽, 高)，单位为点，原点在页面左下角。"""
+        placements = [(self._write_image(image), x, y, w, h) for image, x, y, w, h in tiles]
+        self._write_page(placements, width_pt, height_pt)
+
+    def close(self):
+        """补写页面树、目录、交叉引用表与文件尾，完成后文件即为合法 PDF。"""
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        self._write_obj(self._PAGES_ID, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids)))
+        self._write_obj(self._CATALOG_ID, b'<< /Type /Catalog /Pages %d 0 R >>' % self._PAGES_ID)
+
+        xref_offset = self._fp.tell()
+        size = self._next_id
+        self._fp.write(b'xref\n0 %d\n' % size)
+        self._fp.write(b'0000000000 65535 f \n')
+        for obj_id in range(1, size):
+            self._fp.write(b'%010d 00000 n \n' % self._offsets[obj_id])
+        self._fp.write(b'trailer\n<< /Size %d /Root %d 0 R >>\n' % (size, self._CATALOG_ID))
+        self._fp.write(b'startxref\n%d\n%%%%EOF\n' % xref_offset)
+        self._fp.flush()
@@ -0,0 +1,111 @@
+"""页面渲染结果的磁盘缓存：按文档内容哈希、页码与 DPI 保存 pixmap 的原始采样数据。"""
+import hashlib
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+import fitz
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / 'ToolBox' / 'render_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 文件头：魔数、宽、高、每行字节数、通道数
+_HEADER = struct.Struct('<4sIIII')
+_MAGIC = b'RC01'
+
+# 已计算过的文档哈希，按 (路径, 大小, 修改时间) 记忆，同一文件反复压缩时不必每次重读全文
+_hash_memo: dict[tuple[str, int, int], str] = {}
+
+
+def document_hash(pdf_path: str) -> str:
+    """按文件内容计算哈希；渲染引擎版本也计入其中，升级 PyMuPDF 后旧缓存自然失效。"""
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    if key in _hash_memo:
+        return _hash_memo[key]
+    digest = hashlib.sha256(fitz.VersionBind.encode('ascii'))
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    _hash_memo[key] = digest.hexdigest()[:32]
+    return _hash_memo[key]
+
+
+class RenderCache:
+    """容量超过 max_bytes 时按最近使用时间（文件 mtime）淘汰最旧的条目；可安全地在多个进程中同时使用。
+
+    总大小只在首次写入与淘汰时扫描目录得到，之后按写入量累加；其他进程的写入不计入，
+    因此多个进程同时写入时可能短暂超出上限，由下一次 evict 收回。
+    """
+
+    def __init__(self, cache_dir: str | Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._total: int | None = None
+
+    def _path(self, doc_hash: str, page_index: int, dpi: int) -> Path:
+        return self.cache_dir / f'{doc_hash}_{page_index}_{dpi}.raw'
+
+    def get(self, doc_hash: str, page_index: int, dpi: int) -> tuple[int, int, int, int, bytes] | None:
+        """命中时返回 (宽, 高, 每行字节数, 通道数, 采样数据)，并刷新该条目的使用时间。"""
+        path = self._path(doc_hash, page_index, dpi)
+        try:
+            with open(path, 'rb') as f:
+                magic, width, height, stride, n = _HEADER.unpack(f.read(_HEADER.size))
+                samples = f.read()
+            os.utime(path)
+        except (OSError, struct.error):
+            # 条目不存在、刚被其他进程淘汰或内容残缺，一律当作未命中
+            return None
+        if magic != _MAGIC or len(samples) != stride * height:
+            return None
+        return width, height, stride, n, samples
+
+    def put(self, doc_hash: str, page_index: int, dpi: int, pix: fitz.Pixmap):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(doc_hash, page_index, dpi)
+        # 先写临时文件再原子替换，其他进程不会读到写了一半的条目
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, pix.width, pix.height, pix.stride, pix.n))
+            f.write(pix.samples_mv)
+        if self._total is None:
+            self._total = self._scan_total()
+        self._total += _HEADER.size + len(pix.samples_mv)
+        os.replace(tmp_path, path)
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def _scan_total(self) -> int:
+        total = 0
+        for path in self.cache_dir.glob('*.raw'):
+            try:
+                total += path.stat().st_size
+            except OSError:
+                continue
+        return total
+
+    def evict(self):
+        """扫描缓存目录，删除最久未使用的条目，直到总大小不超过上限。"""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob('*.raw'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._total = total
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.raw'):
+            path.unlink(missing_ok=True)
+        self._total = 0